@@ -0,0 +1,107 @@
+"""Benchmark of the data file's storage formats.
+
+Builds a synthetic library and saves it uncompressed and with each available
+compressor, printing the bytes written and the save and load latencies:
+
+    python bench_storage.py --decks 200 --cards 2000
+
+"full" rewrites every deck (the first save, or a bulk change), "one deck"
+changes a single card and saves again, which is what studying and editing do.
+Saves are timed up to fsync, so the numbers include getting the bytes onto
+storage rather than into the page cache; on slow flash (phones, SD cards) the
+difference between the formats is wider than on a desktop SSD.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+
+import flashcard_app  # noqa: E402
+
+WORDS = (
+    "the of and to in is was for on that with as by at from his her they this have are not but had which one "
+    "were all their there been has when who will more no if out so what up about into than them can only other"
+).split()
+
+
+def make_library(decks, cards, seed=0):
+    rng = random.Random(seed)
+    folders = [flashcard_app.Folder(f"Folder {fi}") for fi in range(max(1, decks // 20))]
+    for di in range(decks):
+        deck = flashcard_app.Deck(f"Deck {di}")
+        deck.extend_cards(
+            [
+                flashcard_app.Card(
+                    " ".join(rng.choices(WORDS, k=rng.randint(3, 12))),
+                    " ".join(rng.choices(WORDS, k=rng.randint(1, 8))),
+                    rng.choice(flashcard_app.STATUSES),
+                )
+                for _ in range(cards)
+            ]
+        )
+        folders[di % len(folders)].add_deck(deck)
+    return folders
+
+
+def timed_save(manager):
+    """Save, returning (seconds until the file is on storage, bytes on disk)."""
+    path = manager.get_data_path()
+    started = time.perf_counter()
+    manager.save_data()
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+    return time.perf_counter() - started, os.path.getsize(path)
+
+
+def timed_load(manager):
+    started = time.perf_counter()
+    folders, dirty = manager._read_library()
+    for folder in folders:
+        for deck in folder.decks:
+            deck.cards
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--decks", type=int, default=200)
+    parser.add_argument("--cards", type=int, default=2000, help="cards per deck")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as home:
+        os.environ["HOME"] = home
+        manager = flashcard_app.DataManager(autoload=False)
+        manager._set_library(make_library(args.decks, args.cards), True)
+        decks = [deck for folder in manager.folders for deck in folder.decks]
+        raw_size = sum(len(chunk) for chunk in manager._encode_library()[0])
+        print(f"{args.decks} decks x {args.cards} cards, {raw_size / 1e6:.1f} MB of JSON\n")
+
+        formats = [None, "gzip"] + (["zstd"] if flashcard_app.zstandard is not None else [])
+        print(f"{'format':<8}{'bytes written':>15}{'ratio':>7}{'full ms':>9}{'one deck ms':>13}{'load ms':>9}")
+        for compression in formats:
+            manager.compression = compression
+            full, incremental, loads = [], [], []
+            for _ in range(args.repeat):
+                for deck in decks:
+                    deck.dirty = True
+                full.append(timed_save(manager)[0])
+                card = random.choice(random.choice(decks).cards)
+                card.status = "know" if card.status != "know" else "dont_know"
+                card._deck.mark_dirty(card)
+                seconds, size = timed_save(manager)
+                incremental.append(seconds)
+                loads.append(timed_load(manager))
+            print(
+                f"{compression or 'none':<8}{size:>15,}{raw_size / size:>7.1f}{statistics.median(full) * 1000:>9.0f}"
+                f"{statistics.median(incremental) * 1000:>13.0f}{statistics.median(loads) * 1000:>9.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
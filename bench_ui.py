@@ -0,0 +1,435 @@
+"""Headless benchmark of the app's screens, replaying a trace of user actions.
+
+Runs FlashcardApp on a synthetic library, replays a trace (the built-in one or
+a recorded one) and prints the latency of every action, the frame times and
+the number of widgets on screen afterwards:
+
+    python bench_ui.py --decks 20 --cards 2000
+    python bench_ui.py --trace trace.json --json report.json --compare baseline.json
+    python bench_ui.py --record trace.json
+    python bench_ui.py --soak 10000
+
+Without a display the window is created by SDL's offscreen video driver, so it
+runs on a Linux box without X (if that driver is missing, use xvfb-run).
+`--record` opens the app normally on your library instead and saves the
+buttons you press and the keys you use when you close it.
+
+The trace is replayed once to warm up the font and texture caches and then
+`--repeat` times; the medians of the measured replays are reported, so a trace
+should end on the screen it starts on. Each action runs from a Clock callback like a real touch or key press. "call"
+is the handler itself, "frame" is until the next frame has been drawn (so it
+includes the layout the action caused) and "settled" until the last frame
+drawn before the app went quiet, after screen transitions and popup
+animations. Frames are not capped at 60 fps, so the frame times show the work
+done per frame.
+`--leaks` takes a leak snapshot (see flashcard_app.LeakDetector) after every
+replay and lists the object types that kept growing. `--soak MARKS` studies
+that many cards in "Random 50" sessions instead, in ten passes after a warm-up
+one, and exits with status 1 if some type grew after every pass or the traced
+memory kept growing by more than SOAK_SLACK.
+
+`--compare` exits with status 1 if an action's first frame comes later than in
+the baseline report (beyond `--tolerance`) or it leaves more widgets on screen;
+"settled" is mostly the length of the animations, so it isn't compared.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+if not os.environ.get("DISPLAY") and not os.environ.get("WAYLAND_DISPLAY"):
+    os.environ.setdefault("SDL_VIDEODRIVER", "offscreen")
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+os.environ.setdefault("KCFG_GRAPHICS_MAXFPS", "0")
+
+import flashcard_app  # noqa: E402
+from bench_storage import make_library  # noqa: E402
+from kivy.animation import Animation  # noqa: E402
+from kivy.clock import Clock  # noqa: E402
+from kivy.core.window import Window  # noqa: E402
+from kivy.lang import Builder  # noqa: E402
+from kivy.uix.behaviors import ButtonBehavior  # noqa: E402
+from kivy.uix.modalview import ModalView  # noqa: E402
+from kivy.uix.textinput import TextInput  # noqa: E402
+
+KEYS = {"space": 32, "enter": 13, "b": 98, "d": 100, "k": 107, "y": 121, "z": 122}
+KEY_NAMES = {code: name for name, code in KEYS.items()}
+
+SETTLE_TICKS = 2  # Loop iterations without drawing or animating after which an action has settled
+TIMEOUT = 10  # Seconds an action may take to settle before the replay gives up
+
+SOAK_SESSION = 50  # Cards studied in a "Random 50" session
+SOAK_PASSES = 10
+SOAK_SLACK = 1_000_000  # Bytes the traced memory may grow by over the soak passes
+
+STUDY = [["key", "space"], ["key", "k"], ["key", "space"], ["key", "d"]]
+DEFAULT_TRACE = (
+    [["press", "Folder 0"], ["press", "Deck 0"]]
+    + [["press", "Next"]] * 5
+    + [["press", "Previous"]] * 2
+    + [["sort", "Question A-Z"], ["press", "Next"], ["filter", "Know"], ["sort", "Deck order"], ["filter", "All cards"]]
+    + [["press", "Edit", 0], ["type", 0, "edited question"], ["press", "Save"]]
+    + [["press", "Add Card"], ["type", 0, "question"], ["type", 1, "answer"], ["press", "Add"]]
+    + [["key", "z", ["ctrl"]], ["key", "y", ["ctrl"]]]
+    + [["press", "Study Deck"]]
+    + STUDY * 10
+    + [["key", "b"], ["press", "Exit"], ["press", "Back to Deck"], ["press", "Back"], ["press", "Back"]]
+)
+
+
+# Finding widgets
+def walk(widget):
+    """The widget and its descendants, in the order they appear on screen."""
+    yield widget
+    for child in reversed(widget.children):
+        yield from walk(child)
+
+
+def active_root(app):
+    """The open popup if there is one, otherwise the current screen."""
+    for widget in Window.children:
+        if isinstance(widget, ModalView):
+            return widget
+    return app.root.current_screen
+
+
+def visible(widget):
+    while widget is not None and widget.parent is not widget:
+        if getattr(widget, "disabled", False) or getattr(widget, "opacity", 1) == 0:
+            return False
+        widget = widget.parent
+    return True
+
+
+def buttons(app, text):
+    return [
+        widget
+        for widget in walk(active_root(app))
+        if isinstance(widget, ButtonBehavior) and getattr(widget, "text", None) == text and visible(widget)
+    ]
+
+
+def widget_count():
+    return sum(1 for child in Window.children for _ in walk(child))
+
+
+# Actions
+def press(app, text, index=0):
+    found = buttons(app, text)
+    if len(found) <= index:
+        raise LookupError(f"no button {text!r} (#{index}) on {active_root(app)}")
+    found[index].dispatch("on_release")
+
+
+def key(app, name, modifiers=()):
+    app.on_key_down(Window, KEYS[name], 0, None, list(modifiers))
+
+
+def type_text(app, index, text):
+    inputs = [widget for widget in walk(active_root(app)) if isinstance(widget, TextInput)]
+    inputs[index].text = text
+
+
+def choose(spinner_id):
+    def action(app, text):
+        app.root.get_screen("deck").ids[spinner_id].text = text
+
+    return action
+
+
+ACTIONS = {
+    "press": press,
+    "key": key,
+    "type": type_text,
+    "sort": choose("card_sort"),
+    "filter": choose("card_filter"),
+    "order": choose("study_order"),
+}
+
+
+def action_name(step):
+    if step[0] == "key":
+        return "key " + "+".join(list(step[2] if len(step) > 2 else ()) + [step[1]])
+    if step[0] in ("press", "sort", "filter", "order"):
+        return f"{step[0]} {step[1]}"
+    return step[0]
+
+
+# Replay
+class Replay:
+    """Run a trace's steps one at a time, each once the previous one has settled."""
+
+    def __init__(self, app, steps, on_done, size=None, snapshot_at=()):
+        self.app = app
+        self.steps = list(steps)
+        self.size = size
+        self.snapshot_at = set(snapshot_at)  # Numbers of steps done after which to take a leak snapshot
+        self.on_done = on_done
+        self.results = []
+        self.frames = []  # Per step, the ms between consecutive frames drawn while it was handled
+        self.traced = []  # Traced bytes at each leak snapshot
+        self._pending = None  # Measurements of the step running now
+        self._poll = None
+
+    def start(self, dt=None):
+        if not self.app.data_manager.ready:
+            Clock.schedule_once(self.start, 0.05)
+            return
+        if self.size:
+            Window.size = self.size
+        if self.snapshot_at:
+            # What the harness keeps about the steps grows with them
+            flashcard_app.leak_detector.ignored.append(__file__)
+            flashcard_app.leak_detector.start()
+        Window.bind(on_flip=self.on_flip)
+        self._poll = Clock.schedule_interval(self.poll, 0)
+        self.run_next()
+
+    def run_next(self):
+        if len(self.results) in self.snapshot_at:
+            flashcard_app.leak_detector.sample()
+            self.traced.append(flashcard_app.leak_detector.snapshots[-1]["traced_bytes"])
+        if len(self.results) == len(self.steps):
+            Window.unbind(on_flip=self.on_flip)
+            self._poll.cancel()
+            self.on_done(self)
+            return
+        step = self.steps[len(self.results)]
+        started = time.perf_counter()
+        ACTIONS[step[0]](self.app, *step[1:])
+        now = time.perf_counter()
+        self._pending = {
+            "action": action_name(step),
+            "started": started,
+            "last_frame": now,
+            "quiet_ticks": 0,
+            "call_ms": (now - started) * 1000,
+            "frame_ms": None,
+            "max_frame_ms": 0.0,
+            "frames": [],
+        }
+
+    def on_flip(self, *args):
+        pending = self._pending
+        if pending is None:
+            return
+        now = time.perf_counter()
+        if pending["frame_ms"] is None:
+            pending["frame_ms"] = (now - pending["started"]) * 1000
+        else:
+            frame = (now - pending["last_frame"]) * 1000
+            pending["frames"].append(frame)
+            pending["max_frame_ms"] = max(pending["max_frame_ms"], frame)
+        pending["last_frame"] = now
+        pending["quiet_ticks"] = 0
+
+    def poll(self, dt):
+        """Finish the running step once a couple of loop iterations went by without drawing or animating."""
+        pending = self._pending
+        if pending is None:
+            return
+        pending["quiet_ticks"] = 0 if Animation._instances else pending["quiet_ticks"] + 1
+        timed_out = time.perf_counter() - pending["started"] > TIMEOUT
+        if pending["quiet_ticks"] < SETTLE_TICKS and not timed_out:
+            return
+        pending["settled_ms"] = (pending["last_frame"] - pending["started"]) * 1000
+        if pending["frame_ms"] is None:
+            # Nothing needed drawing again
+            pending["frame_ms"] = pending["settled_ms"]
+        # A tuple of floats isn't tracked by gc, so leak snapshots don't count it
+        self.frames.append(tuple(pending.pop("frames")))
+        for name in ("started", "last_frame", "quiet_ticks"):
+            del pending[name]
+        pending["widgets"] = widget_count()
+        self.results.append(pending)
+        self._pending = None
+        self.run_next()
+
+
+def summarize(replay, skip=0):
+    """Aggregate the replay's results per action, leaving out the first `skip` steps."""
+    actions = {}
+    for result in replay.results[skip:]:
+        actions.setdefault(result["action"], []).append(result)
+    frames = sorted(frame for step in replay.frames[skip:] for frame in step) or [0.0]
+    return {
+        "actions": {
+            name: {
+                "count": len(results),
+                "call_ms": statistics.median(r["call_ms"] for r in results),
+                "frame_ms": statistics.median(r["frame_ms"] for r in results),
+                "settled_ms": statistics.median(r["settled_ms"] for r in results),
+                "max_settled_ms": max(r["settled_ms"] for r in results),
+                "max_frame_ms": max(r["max_frame_ms"] for r in results),
+                "widgets": max(r["widgets"] for r in results),
+            }
+            for name, results in actions.items()
+        },
+        "frames": {
+            "count": len(frames),
+            "median_ms": statistics.median(frames),
+            "p95_ms": frames[int(len(frames) * 0.95) - 1 if len(frames) > 1 else 0],
+            "max_ms": frames[-1],
+        },
+        "steps": replay.results[skip:],
+        "instrumentation": flashcard_app.instrumentation.snapshot()["operations"],
+        "leaks": dict(flashcard_app.leak_detector.report(), traced=replay.traced) if replay.traced else {},
+    }
+
+
+def print_report(report):
+    print(f"{'action':<28}{'n':>4}{'call ms':>9}{'frame ms':>10}{'settled ms':>12}{'max ms':>8}{'widgets':>9}")
+    for name, stat in report["actions"].items():
+        print(
+            f"{name[:27]:<28}{stat['count']:>4}{stat['call_ms']:>9.1f}{stat['frame_ms']:>10.1f}"
+            f"{stat['settled_ms']:>12.1f}{stat['max_settled_ms']:>8.1f}{stat['widgets']:>9}"
+        )
+    frames = report["frames"]
+    print(
+        f"\nframes: n={frames['count']} median={frames['median_ms']:.1f}ms "
+        f"p95={frames['p95_ms']:.1f}ms max={frames['max_ms']:.1f}ms"
+    )
+    if report["leaks"]:
+        print("\n" + flashcard_app.leak_detector.summary_text())
+        print("traced MB per snapshot: " + " ".join(f"{traced / 1e6:.1f}" for traced in report["leaks"]["traced"]))
+
+
+def regressions(report, baseline, tolerance, slack_ms=5.0):
+    """Describe every action whose first frame came later, or that left more widgets on screen, than in `baseline`."""
+    found = []
+    for name, stat in report["actions"].items():
+        before = baseline["actions"].get(name)
+        if before is None:
+            continue
+        if stat["frame_ms"] > before["frame_ms"] * tolerance + slack_ms:
+            found.append(f"{name}: first frame after {stat['frame_ms']:.1f}ms, was {before['frame_ms']:.1f}ms")
+        if stat["widgets"] > before["widgets"]:
+            found.append(f"{name}: {stat['widgets']} widgets, was {before['widgets']}")
+    return found
+
+
+def soak_trace(marks):
+    """Steps opening the first deck, and the steps of one soak pass: 1/SOAK_PASSES of `marks` cards studied."""
+    sessions = max(1, marks // (SOAK_PASSES * SOAK_SESSION))
+    study = [["key", "k"], ["key", "d"]] * (SOAK_SESSION // 2)
+    session = [["press", "Study Deck"]] + study + [["press", "Back to Deck"]]
+    return [["press", "Folder 0"], ["press", "Deck 0"], ["order", "Random 50"]], session * sessions
+
+
+def leaks(report):
+    """Describe what kept growing over the soak passes."""
+    found = [f"{name} grew by {count} objects" for name, count in report["leaks"]["growing"]]
+    traced = report["leaks"]["traced"][-(flashcard_app.LeakDetector.GROWTH_SNAPSHOTS + 1) :]
+    if all(before < after for before, after in zip(traced, traced[1:])) and traced[-1] - traced[0] > SOAK_SLACK:
+        found.append(f"traced memory grew from {traced[0] / 1e6:.1f} MB to {traced[-1] / 1e6:.1f} MB")
+    return found
+
+
+# Recording
+def record(path):
+    """Run the app on the user's library, saving the buttons pressed and keys used to `path` on exit."""
+    steps = []
+    app = flashcard_app.FlashcardApp()
+    original_release = ButtonBehavior.on_release
+    original_key_down = flashcard_app.FlashcardApp.on_key_down
+
+    def on_release(button):
+        text = getattr(button, "text", None)
+        if text:
+            matches = buttons(app, text)
+            if button in matches:
+                index = matches.index(button)
+                steps.append(["press", text, index] if index else ["press", text])
+        return original_release(button)
+
+    def on_key_down(self, window, code, *args):
+        handled = original_key_down(self, window, code, *args)
+        if handled and code in KEY_NAMES:
+            modifiers = args[2] if len(args) > 2 else []
+            steps.append(["key", KEY_NAMES[code], sorted(modifiers)] if modifiers else ["key", KEY_NAMES[code]])
+        return handled
+
+    ButtonBehavior.on_release = on_release
+    flashcard_app.FlashcardApp.on_key_down = on_key_down
+    app.run()
+    with open(path, "w") as f:
+        json.dump(steps, f, indent=1)
+    print(f"Recorded {len(steps)} steps to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--decks", type=int, default=20)
+    parser.add_argument("--cards", type=int, default=2000, help="cards per deck")
+    parser.add_argument("--trace", help="JSON list of steps to replay instead of the built-in trace")
+    parser.add_argument("--repeat", type=int, default=3, help="measured replays, after one warm-up replay")
+    parser.add_argument("--size", default="800x600", help="window size; drawing big frames in software is slow")
+    parser.add_argument("--record", metavar="PATH", help="use the app normally and save a trace to PATH")
+    parser.add_argument("--leaks", action="store_true", help="take a leak snapshot after every replay")
+    parser.add_argument("--soak", type=int, metavar="MARKS", help="study MARKS cards and check memory stays bounded")
+    parser.add_argument("--json", metavar="PATH", help="write the full report to PATH")
+    parser.add_argument("--compare", metavar="PATH", help="report written by an earlier --json run")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="allowed slowdown against --compare")
+    args = parser.parse_args()
+
+    Builder.load_string(flashcard_app.kv_content)
+    if args.record:
+        record(args.record)
+        return
+
+    start, steps = [], DEFAULT_TRACE
+    if args.trace:
+        with open(args.trace) as f:
+            steps = json.load(f)
+    passes = args.repeat
+    if args.soak:
+        (start, steps), passes = soak_trace(args.soak), SOAK_PASSES
+    snapshot_at = ()
+    if args.leaks or args.soak:
+        snapshot_at = [len(start) + len(steps) * done for done in range(1, passes + 2)]
+
+    with tempfile.TemporaryDirectory() as home:
+        os.environ["HOME"] = home
+        manager = flashcard_app.DataManager(autoload=False)
+        manager._set_library(make_library(args.decks, args.cards), True)
+        manager.save_data()
+
+        flashcard_app.instrumentation.enabled = True
+        app = flashcard_app.FlashcardApp()
+        done = SimpleNamespace(report=None)
+
+        def finish(replay):
+            done.report = summarize(replay, skip=len(start) + len(steps))
+            app.stop()
+
+        size = tuple(int(n) for n in args.size.split("x"))
+        # The Clock only keeps a weak reference to the replay
+        replay = Replay(app, start + steps * (passes + 1), finish, size, snapshot_at)
+        Clock.schedule_once(replay.start)
+        app.run()
+
+    if done.report is None:
+        sys.exit("The app closed before the trace finished")
+    print_report(done.report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(done.report, f, indent=1)
+    found = []
+    if args.compare:
+        with open(args.compare) as f:
+            found = ["REGRESSION " + line for line in regressions(done.report, json.load(f), args.tolerance)]
+    if args.soak:
+        found += ["LEAK " + line for line in leaks(done.report)]
+    for line in found:
+        print(line)
+    if found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
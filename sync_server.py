@@ -0,0 +1,169 @@
+"""Reference sync server for the flashcard app.
+
+A small stdlib-only HTTP server that devices sync their libraries against.
+Run it locally with:
+
+    python sync_server.py --port 8765 --state sync_state.json
+
+Every record (folder, deck or card) is stored field by field together with
+the timestamp and device of the last change and the server sequence number
+at which it was accepted. A device sends the fields it changed since its
+last sync and receives every record changed since then, so a round trip
+costs O(changes), not O(library).
+"""
+
+import argparse
+import gzip
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# When two devices changed a card's status since they last synced, the status
+# that keeps the card in review wins, regardless of which change came last.
+STATUS_MERGE_PRIORITY = {"dont_know": 3, "unknown": 2, "know": 1, "new": 0}
+
+
+class SyncState:
+    def __init__(self, path=None):
+        self.path = path
+        self.records = {}
+        self.seq = 0
+        # record id -> seq of its last change, in the order the changes happened
+        self.order = {}
+        self.lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            self.records = state["records"]
+            self.seq = state["seq"]
+            for record_id, record in sorted(self.records.items(), key=lambda item: item[1]["seq"]):
+                self.order[record_id] = record["seq"]
+
+    def sync(self, device, since, changes):
+        """Merge a device's changes and return everything changed since `since`."""
+        with self.lock:
+            for change in changes:
+                self._merge(device, since, change)
+            if self.path:
+                self._save()
+            return {"seq": self.seq, "changes": self.changes_since(since)}
+
+    def _wins(self, field, value, timestamp, device, current, since):
+        current_value, current_timestamp, current_device, current_seq = current
+        if current_seq <= since:
+            # Nobody else changed the field since this device last synced
+            return True
+        if field == "status" and value != current_value:
+            return STATUS_MERGE_PRIORITY.get(value, 0) > STATUS_MERGE_PRIORITY.get(current_value, 0)
+        # Last writer wins, with the device id as a deterministic tie-break
+        return (timestamp, device) > (current_timestamp, current_device)
+
+    def _merge(self, device, since, change):
+        record = self.records.get(change["id"])
+        if record is None:
+            record = {"type": change["type"], "fields": {}, "deleted": None, "seq": 0}
+        changed = False
+
+        if change.get("deleted"):
+            deleted = record["deleted"]
+            if deleted is None or (change["deleted"], device) > tuple(deleted):
+                record["deleted"] = [change["deleted"], device]
+                changed = True
+
+        updates = {}
+        for field, (value, timestamp) in change.get("fields", {}).items():
+            current = record["fields"].get(field)
+            if current is None or self._wins(field, value, timestamp, device, current, since):
+                if current is None or current[0] != value:
+                    updates[field] = (value, timestamp)
+        if updates and record["deleted"] is not None:
+            # An edit newer than the deletion brings the record back
+            if max(timestamp for value, timestamp in updates.values()) > record["deleted"][0]:
+                record["deleted"] = None
+            else:
+                updates = {}
+
+        if not changed and not updates:
+            return
+        self.seq += 1
+        for field, (value, timestamp) in updates.items():
+            record["fields"][field] = [value, timestamp, device, self.seq]
+        record["seq"] = self.seq
+        self.records[change["id"]] = record
+        self.order.pop(change["id"], None)
+        self.order[change["id"]] = self.seq
+
+    def changes_since(self, since):
+        changed = []
+        for record_id, seq in reversed(self.order.items()):
+            if seq <= since:
+                break
+            record = self.records[record_id]
+            changed.append(
+                {
+                    "type": record["type"],
+                    "id": record_id,
+                    "fields": {field: [value[0], value[1]] for field, value in record["fields"].items()},
+                    "deleted": record["deleted"] is not None,
+                }
+            )
+        changed.reverse()
+        return changed
+
+    def _save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"seq": self.seq, "records": self.records}, f)
+        os.replace(tmp_path, self.path)
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path != "/sync":
+            self.send_error(404)
+            return
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        try:
+            request = json.loads(body)
+            result = self.server.state.sync(request["device"], request["since"], request["changes"])
+        except (ValueError, KeyError, TypeError) as e:
+            self.send_error(400, str(e))
+            return
+
+        data = json.dumps(result).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            data = gzip.compress(data)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host="127.0.0.1", port=8765, state_path=None):
+    """Create a sync server; port 0 picks a free port (see server.server_address)."""
+    server = ThreadingHTTPServer((host, port), SyncHandler)
+    server.state = SyncState(state_path)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reference sync server for the flashcard app")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--state", help="JSON file to keep the server state in between runs")
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.state)
+    print(f"Sync server listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
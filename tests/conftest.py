@@ -0,0 +1,14 @@
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("KIVY_NO_ARGS", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def home(tmp_path, monkeypatch):
+    """A fresh home directory, so each test's DataManager starts with its own library."""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    return tmp_path
@@ -0,0 +1,84 @@
+import random
+
+import pytest
+
+from flashcard_app import AnswerChecker, allowed_typos, edit_distance, normalize_answer, pattern_masks
+
+
+def levenshtein(a, b):
+    """Textbook dynamic programming, as the reference."""
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def random_pairs(count, seed, alphabet="abcd", max_length=12):
+    rng = random.Random(seed)
+    for _ in range(count):
+        a = "".join(rng.choice(alphabet) for _ in range(rng.randrange(max_length + 1)))
+        b = "".join(rng.choice(alphabet) for _ in range(rng.randrange(max_length + 1)))
+        yield a, b
+
+
+def test_edit_distance_matches_reference():
+    for a, b in random_pairs(3000, seed=1):
+        assert edit_distance(a, pattern_masks(a), b) == levenshtein(a, b), (a, b)
+
+
+def test_edit_distance_beyond_machine_words():
+    # Patterns longer than 64 characters use wider Python ints
+    for a, b in random_pairs(100, seed=2, alphabet="abcdefghij", max_length=150):
+        assert edit_distance(a, pattern_masks(a), b) == levenshtein(a, b)
+
+
+def test_edit_distance_with_limit():
+    for a, b in random_pairs(3000, seed=3):
+        for limit in (0, 1, 2, 4):
+            distance = levenshtein(a, b)
+            expected = distance if distance <= limit else limit + 1
+            assert edit_distance(a, pattern_masks(a), b, limit) == expected, (a, b, limit)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("  Hello,   World! ", "hello world"),
+        ("Café crème", "cafe creme"),
+        ("STRASSE", "strasse"),
+        ("straße", "strasse"),
+        ("Ｆｕｌｌ width", "full width"),
+        ("well-known", "well known"),
+        # Marks that are part of a letter in other scripts stay
+        ("й", "й"),
+        ("नमस्ते", "नमस्ते"),
+    ],
+)
+def test_normalize_answer(text, expected):
+    assert normalize_answer(text) == expected
+
+
+def test_allowed_typos():
+    assert [allowed_typos(length) for length in (0, 3, 4, 7, 8, 16)] == [0, 0, 1, 1, 2, 3]
+
+
+def test_grade():
+    checker = AnswerChecker()
+    assert checker.grade("c1", "Photosynthesis", "photosynthesis!") == ("correct", 0)
+    assert checker.grade("c1", "Photosynthesis", "photosynthasis") == ("close", 1)
+    assert checker.grade("c1", "Photosynthesis", "fotosynthesis") == ("close", 2)
+    assert checker.grade("c1", "Photosynthesis", "respiration")[0] == "wrong"
+    assert checker.grade("c2", "cat", "cut")[0] == "wrong"
+
+
+def test_checker_rebuilds_an_edited_card_and_stays_bounded():
+    checker = AnswerChecker(capacity=3)
+    assert checker.grade("c1", "apple", "apple")[0] == "correct"
+    assert checker.grade("c1", "pear", "pear")[0] == "correct"
+    assert checker.grade("c1", "pear", "apple")[0] == "wrong"
+    for i in range(10):
+        checker.grade(f"c{i}", "word", "word")
+    assert len(checker.cache) == 3
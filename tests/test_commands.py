@@ -0,0 +1,96 @@
+from flashcard_app import CommandLog, DataManager
+
+
+def test_undo_and_redo_availability(home):
+    manager = DataManager()
+    log = manager.commands
+    assert not log.can_undo() and not log.can_redo()
+    manager.add_card(0, 0, "q", "a")
+    assert log.can_undo() and not log.can_redo()
+    manager.undo()
+    assert not log.can_undo() and log.can_redo()
+    assert manager.folders[0].decks[0].cards == []
+    manager.redo()
+    assert [card.question for card in manager.folders[0].decks[0].cards] == ["q"]
+
+
+def test_adding_folders_and_decks_is_undoable(home):
+    manager = DataManager()
+    fi = manager.add_folder("Folder")
+    folder = manager.folders[fi]
+    di = manager.add_deck(fi, "Deck")
+    deck = folder.decks[di]
+    assert manager.get_folder(folder.id) is folder and manager.get_deck(deck.id) is deck
+
+    manager.undo()
+    assert folder.decks == [] and manager.get_deck(deck.id) is None
+    manager.undo()
+    assert folder not in manager.folders and manager.get_folder(folder.id) is None
+    assert [folder.name for folder in DataManager().folders] == ["Default Folder"]
+
+    manager.redo()
+    manager.redo()
+    reopened = DataManager()
+    assert reopened.get_deck(deck.id).name == "Deck"
+    assert reopened.get_folder(folder.id).decks == [reopened.get_deck(deck.id)]
+
+
+def test_change_from_another_process_keeps_history_of_other_decks(home):
+    first = DataManager()
+    first.add_deck(0, "Other")
+    first.add_card(0, 0, "q1", "a")
+    first.add_card(0, 1, "q2", "a")
+    second = DataManager()
+    second.ensure_loaded()
+    kept, dropped = [first.folders[0].decks[i].cards[0].id for i in (0, 1)]
+    first.edit_card(kept, "q1 edited", "a")
+    first.edit_card(dropped, "q2 edited", "a")
+    second.add_card(0, 1, "from second", "a")
+
+    assert first.check_external_changes()
+    # The edit to the deck the other process changed can't be undone by position any more; the other one can
+    assert first.undo() is not None
+    first.ensure_loaded()
+    assert first.get_card(kept).question == "q1"
+    assert first.get_card(dropped).question == "q2 edited"
+
+
+class Step:
+    """A command that only records which decks it relies on."""
+
+    def __init__(self, *records):
+        self._records = records
+
+    def apply(self):
+        pass
+
+    def undo(self):
+        pass
+
+    def records(self):
+        return self._records
+
+    def touched(self, undone):
+        return ()
+
+
+def test_discard_drops_what_depends_on_a_changed_record():
+    log = CommandLog()
+    edit_a, merge, edit_b, edit_c = Step("a"), Step("a", "b"), Step("b"), Step("c")
+    for command in (edit_a, merge, edit_b, edit_c, Step("c")):
+        log.execute(command)
+    log.undo()
+    log.discard({"a"})
+    # The merge relied on deck a and everything before it that touched a; what came after it
+    # only needs the decks as they are now
+    assert log.history() == [edit_b, edit_c] + log._redo
+    assert log.undo() is edit_c and log.undo() is edit_b and log.undo() is None
+
+    log = CommandLog()
+    for command in (edit_a, merge, edit_b):
+        log.execute(command)
+    for _ in range(3):
+        log.undo()
+    log.discard({"b"})
+    # edit_a is redone first and relies on nothing that changed; the merge and what followed it go
+    assert log.redo() is edit_a and log.redo() is None
@@ -0,0 +1,102 @@
+import gzip
+
+import pytest
+
+import flashcard_app
+from flashcard_app import DataManager, compress_member, decompress_library, default_compression
+
+
+def compressed_library(home, compression="gzip", decks=3):
+    manager = DataManager()
+    manager.compression = compression
+    for di in range(decks):
+        deck_index = manager.add_deck(0, f"Deck {di}")
+        for ci in range(20):
+            manager.add_card(0, deck_index, f"q{di}.{ci}", f"a{di}.{ci}")
+    manager.save_data()
+    return manager
+
+
+@pytest.mark.parametrize("value, expected", [(None, None), ("none", None), ("gzip", "gzip"), (" GZIP ", "gzip")])
+def test_default_compression(monkeypatch, value, expected):
+    if value is None:
+        monkeypatch.delenv("FLASHCARD_COMPRESSION", raising=False)
+    else:
+        monkeypatch.setenv("FLASHCARD_COMPRESSION", value)
+    assert default_compression() == expected
+
+
+@pytest.mark.parametrize("value", ["zip", "gz", ""])
+def test_unknown_compression_falls_back_to_none(monkeypatch, value):
+    monkeypatch.setenv("FLASHCARD_COMPRESSION", value)
+    assert default_compression() is None
+
+
+def test_zstd_without_module_falls_back_to_gzip(monkeypatch):
+    monkeypatch.setenv("FLASHCARD_COMPRESSION", "zstd")
+    monkeypatch.setattr(flashcard_app, "zstandard", None)
+    assert default_compression() == "gzip"
+
+
+def test_members_decompress_as_one_stream():
+    pieces = [b"[\n", b'{"id": "a"},\n', b'{"id": "b"}\n', b"]\n"]
+    data = b"".join(compress_member(piece, "gzip") for piece in pieces)
+    raw, members = decompress_library(data)
+    assert raw == b"".join(pieces) == gzip.decompress(data)
+    # Each member is found by where its output starts, and decompresses alone
+    for output_start, (start, length, output_length) in members.items():
+        assert decompress_library(data[start : start + length])[0] == raw[output_start : output_start + output_length]
+
+
+def test_uncompressed_data_is_returned_as_is():
+    assert decompress_library(b"[]\n") == (b"[]\n", None)
+
+
+@pytest.mark.parametrize("data", [b"\x1f\x8b\x08\x00" + b"garbage" * 20, gzip.compress(b"[]\n" * 100)[:-12]])
+def test_corrupt_or_truncated_data_raises_value_error(data):
+    with pytest.raises(ValueError):
+        decompress_library(data)
+
+
+def test_zstd_file_without_module_raises_value_error(monkeypatch):
+    monkeypatch.setattr(flashcard_app, "zstandard", None)
+    with pytest.raises(ValueError, match="zstandard"):
+        decompress_library(b"\x28\xb5\x2f\xfd" + b"\x00" * 16)
+
+
+def test_compressed_library_reloads(home):
+    manager = compressed_library(home)
+    with open(manager.get_data_path(), "rb") as f:
+        assert f.read(2) == flashcard_app.GZIP_MAGIC
+    loaded = DataManager()
+    assert [deck.name for deck in loaded.folders[0].decks] == [deck.name for deck in manager.folders[0].decks]
+    assert loaded.folders[0].decks[-1].cards[-1].question == "q2.19"
+
+
+def test_unloaded_deck_is_read_back_from_its_member(home):
+    manager = compressed_library(home)
+    deck = manager.folders[0].decks[1]
+    assert deck._member is not None
+    manager.current_deck_id = None
+    assert manager._evict_deck(deck)
+    assert [card.question for card in deck.cards][:2] == ["q0.0", "q0.1"]
+
+
+def test_stale_member_falls_back_to_reading_the_whole_file(home):
+    manager = compressed_library(home)
+    deck = manager.folders[0].decks[2]
+    manager.current_deck_id = None
+    assert manager._evict_deck(deck)
+    # Point the deck at another deck's member, as if the file had been rewritten since
+    deck._member = manager.folders[0].decks[1]._member
+    assert deck.cards[0].question == "q1.0"
+    assert deck._member != manager.folders[0].decks[1]._member
+
+
+def test_unchanged_decks_keep_their_members_across_saves(home):
+    manager = compressed_library(home)
+    before = [deck._member for deck in manager.folders[0].decks]
+    manager.add_card(0, 3, "new", "card")
+    manager.save_data()
+    after = [deck._member for deck in manager.folders[0].decks]
+    assert after[:3] == before[:3] and after[3] != before[3]
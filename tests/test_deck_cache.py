@@ -0,0 +1,36 @@
+import pytest
+
+from flashcard_app import DataManager, default_cache_budget
+
+
+def test_budget_from_environment(monkeypatch):
+    monkeypatch.setenv("FLASHCARD_DECK_CACHE_MB", "1.5")
+    assert default_cache_budget() == 1536 * 1024
+
+
+@pytest.mark.parametrize("value", ["abc", "", "0", "-5", "nan", "inf"])
+def test_invalid_budget_falls_back_to_default(monkeypatch, value):
+    monkeypatch.delenv("FLASHCARD_DECK_CACHE_MB", raising=False)
+    default = default_cache_budget()
+    monkeypatch.setenv("FLASHCARD_DECK_CACHE_MB", value)
+    assert default_cache_budget() == default > 0
+
+
+def test_invalid_budget_doesnt_stop_the_app(home, monkeypatch):
+    monkeypatch.setenv("FLASHCARD_DECK_CACHE_MB", "abc")
+    assert DataManager().ready
+
+
+def test_decks_past_the_budget_are_unloaded_and_read_back(home):
+    manager = DataManager()
+    for di in range(3):
+        deck_index = manager.add_deck(0, f"Deck {di}")
+        for ci in range(50):
+            manager.add_card(0, deck_index, f"q{di}.{ci}", "a")
+    reopened = DataManager()
+    reopened.ensure_loaded()
+    decks = reopened.folders[0].decks
+    assert all(deck.loaded for deck in decks)
+    reopened.deck_cache.enforce(0)
+    assert not any(deck.loaded for deck in decks)
+    assert decks[2].cards[49].question == "q1.49"
@@ -0,0 +1,110 @@
+import random
+
+import pytest
+
+import flashcard_app
+from flashcard_app import SORT_KEYS, STATUS_SORT_ORDER, STATUSES, Card, Deck, DataManager, SortIndex, deck_view
+
+
+def random_deck(count, seed=0):
+    rng = random.Random(seed)
+    deck = Deck("Deck")
+    cards = []
+    for i in range(count):
+        card = Card(rng.choice(["Apple", "apple", "banana", "Cherry", "date"]) + str(rng.randrange(5)), f"a{i}")
+        card.edited = rng.randrange(3)
+        card.status = rng.choice(STATUSES)
+        cards.append(card)
+    deck.extend_cards(cards)
+    return deck
+
+
+def expected_view(deck, sort, status=None):
+    positions = range(len(deck.cards))
+    if sort in SORT_KEYS:
+        positions = sorted(positions, key=lambda i: (SORT_KEYS[sort](deck.cards[i]), i))
+    if status is not None:
+        return [i for i in positions if deck.cards[i].status == status]
+    if sort == "status":
+        return sorted(positions, key=lambda i: STATUS_SORT_ORDER.index(deck.cards[i].status))
+    return list(positions)
+
+
+@pytest.fixture(params=["numpy", "plain"])
+def numpy_or_not(request, monkeypatch):
+    if request.param == "plain":
+        monkeypatch.setattr(flashcard_app, "numpy", None)
+    elif flashcard_app.numpy is None:
+        pytest.skip("numpy is not installed")
+
+
+@pytest.mark.parametrize("sort", ["position", "status", "question", "answer", "edited"])
+@pytest.mark.parametrize("status", [None] + list(STATUSES))
+def test_deck_view_matches_sorting_the_cards(numpy_or_not, sort, status):
+    deck = random_deck(300)
+    assert list(deck_view(deck, sort, status)) == expected_view(deck, sort, status)
+
+
+def test_sort_index_stays_sorted_through_changes():
+    rng = random.Random(1)
+    deck = random_deck(50)
+    index = SortIndex(SORT_KEYS["question"], deck.cards)
+
+    def check():
+        assert list(index.order) == expected_view(deck, "question")
+
+    check()
+    for _ in range(200):
+        operation = rng.random()
+        if operation < 0.5:
+            card = rng.choice(deck.cards)
+            card.question = rng.choice(["Apple", "kiwi", "banana", "Zucchini"]) + str(rng.randrange(5))
+            index.refresh(card)
+        elif operation < 0.8:
+            card = Card(rng.choice(["fig", "Apple", "cherry"]), "a")
+            card._slot = len(deck.cards)
+            deck.cards.append(card)
+            index.append(card)
+        elif len(deck.cards) > 1:
+            deck.cards.pop()
+            index.pop()
+        check()
+    keep = bytearray(rng.randrange(2) for _ in deck.cards)
+    index.compact(keep)
+    deck.cards[:] = [card for card, kept in zip(deck.cards, keep) if kept]
+    check()
+
+
+def test_deck_keeps_its_sort_indexes_up_to_date(home):
+    manager = DataManager()
+    for question in ["pear", "Apple", "fig", "banana"]:
+        manager.add_card(0, 0, question, "a")
+    deck = manager.folders[0].decks[0]
+    assert [deck.cards[i].question for i in deck_view(deck, "question")] == ["Apple", "banana", "fig", "pear"]
+    manager.edit_card(deck.cards[2].id, "cherry", "a")
+    manager.add_card(0, 0, "date", "a")
+    assert [deck.cards[i].question for i in deck_view(deck, "question")] == [
+        "Apple",
+        "banana",
+        "cherry",
+        "date",
+        "pear",
+    ]
+    manager.undo()
+    manager.undo()
+    assert [deck.cards[i].question for i in deck_view(deck, "question")] == ["Apple", "banana", "fig", "pear"]
+    # Most recently edited first
+    manager.edit_card(deck.cards[0].id, "pear", "b")
+    assert deck_view(deck, "edited")[0] == 0
+
+
+def test_split_deck_compacts_the_sort_indexes(home):
+    manager = DataManager()
+    for question, status in [("d", "know"), ("c", "new"), ("b", "know"), ("a", "new")]:
+        manager.add_card(0, 0, question, "a")
+        manager.update_card_status(manager.folders[0].decks[0].cards[-1].id, status)
+    deck = manager.folders[0].decks[0]
+    deck_view(deck, "question")
+    split = manager.split_deck(deck.id, "know")
+    assert [deck.cards[i].question for i in deck_view(deck, "question")] == ["a", "c"]
+    assert [split.cards[i].question for i in deck_view(split, "question")] == ["b", "d"]
@@ -0,0 +1,93 @@
+import json
+
+from flashcard_app import DataManager
+
+
+def two_processes(*questions):
+    """Two managers on the same data file, as when the app runs twice."""
+    first = DataManager()
+    for question in questions:
+        first.add_card(0, 0, question, "a")
+    second = DataManager()
+    second.ensure_loaded()
+    return first, second
+
+
+def reopened():
+    manager = DataManager()
+    manager.ensure_loaded()
+    return manager
+
+
+def questions(manager):
+    return [card.question for card in manager.folders[0].decks[0].cards]
+
+
+def test_cards_added_by_both_processes_are_kept(home):
+    first, second = two_processes("a1")
+    first.add_card(0, 0, "b1", "a")
+    second.add_card(0, 0, "b2", "a")
+    assert questions(second) == ["a1", "b2", "b1"]
+    assert first.check_external_changes()
+    assert sorted(questions(first)) == ["a1", "b1", "b2"]
+    assert sorted(questions(reopened())) == ["a1", "b1", "b2"]
+
+
+def test_changes_to_different_fields_are_both_kept(home):
+    first, second = two_processes("q1", "q2")
+    card_id = first.folders[0].decks[0].cards[0].id
+    first.edit_card(card_id, "edited", "a")
+    second.update_card_status(card_id, "know")
+    card = second.get_card(card_id)
+    assert (card.question, card.status) == ("edited", "know")
+    assert reopened().get_card(card_id).question == "edited"
+
+
+def test_card_removed_elsewhere_is_removed_here(home):
+    first, second = two_processes("q1")
+    first.add_card(0, 0, "gone", "a")
+    second.check_external_changes()
+    first.undo()
+    second.edit_card(second.folders[0].decks[0].cards[0].id, "q1 edited", "a")
+    assert questions(second) == ["q1 edited"]
+    assert second.get_card(first.folders[0].decks[0].cards[0].id) is not None
+
+
+def test_conflicting_edits_keep_the_local_side_and_warn(home, capsys):
+    first, second = two_processes("q1")
+    card_id = first.folders[0].decks[0].cards[0].id
+    first.edit_card(card_id, "from first", "a")
+    second.edit_card(card_id, "from second", "a")
+    assert second.get_card(card_id).question == "from second"
+    assert "conflict" in capsys.readouterr().out
+    assert reopened().get_card(card_id).question == "from second"
+
+
+def test_card_changed_elsewhere_survives_local_removal_of_another(home):
+    first, second = two_processes("q1")
+    second.add_card(0, 0, "local", "a")
+    first.check_external_changes()
+    first.edit_card(first.folders[0].decks[0].cards[0].id, "q1 there", "a")
+    second.undo()
+    assert questions(second) == ["q1 there"]
+
+
+def test_legacy_file_written_elsewhere_keeps_the_ids_it_is_given(home):
+    manager = DataManager()
+    legacy = [
+        {"name": "Old", "decks": [{"name": "Deck", "cards": [{"question": "q", "answer": "a", "status": "new"}]}]}
+    ]
+    with open(manager.get_data_path(), "w") as f:
+        json.dump(legacy, f, indent=2)
+    assert manager.check_external_changes()
+    manager.save_data()
+
+    folder_id = manager.folders[0].id
+    deck_id = manager.folders[0].decks[0].id
+    card_id = manager.folders[0].decks[0].cards[0].id
+    for _ in range(2):
+        manager = reopened()
+        assert manager.folders[0].id == folder_id
+        assert not manager.folders[0].dirty
+        assert manager.get_deck(deck_id).name == "Deck"
+        assert manager.get_card(card_id).question == "q"
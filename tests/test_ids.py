@@ -0,0 +1,92 @@
+import json
+import os
+
+from flashcard_app import DataManager
+
+
+def reopened():
+    manager = DataManager()
+    manager.ensure_loaded()
+    return manager
+
+
+def test_lookups_by_id(home):
+    manager = DataManager()
+    fi = manager.add_folder("Folder")
+    manager.add_deck(fi, "Deck")
+    manager.add_card(fi, 0, "q", "a")
+    folder = manager.folders[fi]
+    deck = folder.decks[0]
+    card = deck.cards[0]
+
+    assert manager.get_folder(folder.id) is folder
+    assert manager.get_deck(deck.id) is deck
+    assert manager.get_card(card.id) is card
+    assert manager.cards_by_id[card.id] is card
+    assert manager.get_card("missing") is None and manager.get_deck("missing") is None
+
+    # A card that no longer belongs to a deck is not found
+    manager.undo()
+    assert manager.get_card(card.id) is None
+    manager.redo()
+    assert manager.get_card(card.id) is card
+
+
+def test_ids_survive_reloading(home):
+    manager = DataManager()
+    manager.add_card(0, 0, "q", "a")
+    folder_id = manager.folders[0].id
+    deck_id = manager.folders[0].decks[0].id
+    card_id = manager.folders[0].decks[0].cards[0].id
+
+    manager = DataManager()
+    assert manager.get_folder(folder_id).name == "Default Folder"
+    assert manager.get_deck(deck_id).name == "Default Deck"
+    # Lazily decoded decks index their cards once they are decoded
+    manager.ensure_loaded()
+    assert manager.get_card(card_id).question == "q"
+
+
+def test_legacy_file_gets_ids_that_are_saved(home):
+    path = home / ".flashcardapp" / "flashcards.json"
+    os.makedirs(path.parent)
+    legacy = [
+        {"name": "Old", "decks": [{"name": "Deck", "cards": [{"question": "q", "answer": "a", "status": "know"}]}]}
+    ]
+    path.write_text(json.dumps(legacy, indent=2))
+
+    manager = reopened()
+    folder = manager.folders[0]
+    deck = folder.decks[0]
+    card = deck.cards[0]
+    assert folder.id and deck.id and card.id
+    assert card.status == "know"
+    # Loading an id-less file rewrites it at once, so the ids just given out are kept
+    saved = json.loads(path.read_bytes())
+    assert saved[0]["id"] == folder.id
+    assert saved[0]["decks"][0]["id"] == deck.id
+    assert saved[0]["decks"][0]["cards"][0]["id"] == card.id
+
+    for _ in range(2):
+        manager = reopened()
+        assert manager.folders[0].id == folder.id
+        assert manager.get_deck(deck.id).name == "Deck"
+        assert manager.get_card(card.id).question == "q"
+
+
+def test_line_file_with_null_ids_gets_ids_that_are_saved(home):
+    manager = DataManager()
+    manager.add_card(0, 0, "q", "a")
+    path = manager.get_data_path()
+    with open(path, "rb") as f:
+        raw = f.read()
+    for record_id in (manager.folders[0].id, manager.folders[0].decks[0].id, manager.folders[0].decks[0].cards[0].id):
+        raw = raw.replace(f'"{record_id}"'.encode(), b"null")
+    with open(path, "wb") as f:
+        f.write(raw)
+
+    manager = reopened()
+    ids = (manager.folders[0].id, manager.folders[0].decks[0].id, manager.folders[0].decks[0].cards[0].id)
+    for _ in range(2):
+        manager = reopened()
+        assert (manager.folders[0].id, manager.folders[0].decks[0].id, manager.folders[0].decks[0].cards[0].id) == ids
@@ -0,0 +1,195 @@
+import json
+import sqlite3
+import zipfile
+
+import pytest
+
+from flashcard_app import (
+    MediaStore,
+    detect_encoding,
+    detect_import_format,
+    rank_separators,
+    read_apkg,
+    read_table,
+    sample_file,
+)
+
+WORDS = [("привет", "hello"), ("спасибо", "thank you"), ("кошка", "cat"), ("собака", "dog")]
+ACCENTS = [("café", "coffee"), ("garçon", "boy"), ("élève", "pupil"), ("Noël", "Christmas")]
+
+
+def lines(pairs, separator=";"):
+    return "".join(f"{question}{separator}{answer}\n" for question, answer in pairs)
+
+
+@pytest.mark.parametrize(
+    "data, encoding",
+    [
+        (b"\xef\xbb\xbf" + lines(WORDS).encode("utf-8"), "utf-8-sig"),
+        (lines(WORDS).encode("utf-16"), "utf-16"),
+        (lines(WORDS + ACCENTS).encode("utf-8"), "utf-8"),
+        (lines(WORDS).encode("cp1251"), "cp1251"),
+        (lines(ACCENTS).encode("cp1252"), "cp1252"),
+        (b"plain;ascii\n", "utf-8"),
+    ],
+)
+def test_detect_encoding(data, encoding):
+    assert detect_encoding(data) == encoding
+
+
+def test_detect_import_format_of_small_files(home, tmp_path):
+    path = tmp_path / "words.txt"
+    path.write_bytes(lines(WORDS).encode("cp1251"))
+    assert detect_import_format(str(path)) == ("cp1251", [";"])
+    path.write_bytes(lines(ACCENTS, "\t").encode("cp1252"))
+    assert detect_import_format(str(path)) == ("cp1252", ["\t"])
+    path.write_bytes(b"\xef\xbb\xbf" + lines(WORDS, ",").encode("utf-8"))
+    assert detect_import_format(str(path)) == ("utf-8-sig", [","])
+    # Archives have neither an encoding nor a separator
+    assert detect_import_format(str(tmp_path / "deck.apkg")) == (None, [])
+
+
+def test_rank_separators():
+    assert rank_separators(lines(WORDS, "\t").splitlines())[0] == "\t"
+    assert rank_separators(lines(WORDS, ",").splitlines())[0] == ","
+    # Commas inside answers don't beat the separator every line has
+    assert rank_separators(["apple;pomme, fruit", "pear;poire", "plum;prune, fruit"]) == [";", ","]
+    # With every line splitting as well, the earlier candidate wins
+    assert rank_separators(["well-known,bien connu", "x-ray,radiographie"]) == [",", "-"]
+    # A separator only some lines have ranks below one all lines have
+    assert rank_separators(["a;b", "c;d", "e\tf;g"]) == [";", "\t"]
+    # An empty side doesn't make a card
+    assert rank_separators(["a;", ";b", "c|d"]) == ["|"]
+    assert rank_separators(["# comment;with;separators", "", "   "]) == []
+
+
+def test_chunks_from_further_in_are_sampled(home, tmp_path):
+    path = tmp_path / "big.txt"
+    head = lines([("word", "meaning")] * 1000)
+    tail = lines(WORDS * 300)
+    path.write_bytes(head.encode("ascii") + tail.encode("cp1251"))
+
+    sampled_head, chunks = sample_file(str(path))
+    assert len(sampled_head) <= 8192 and sampled_head.endswith(b"meaning")
+    assert len(chunks) == 4
+    for chunk in chunks:
+        # Whole lines only, cut at line breaks
+        assert all(line.count(b";") == 1 for line in chunk.split(b"\n"))
+    # The head alone is ASCII; the cp1251 text is only seen in the chunks
+    assert detect_encoding(sampled_head) == "utf-8"
+    assert detect_import_format(str(path)) == ("cp1251", [";"])
+
+
+def test_separator_is_found_past_a_long_header(home, tmp_path):
+    path = tmp_path / "commented.txt"
+    header = "# exported word list, one card per line\n" * 400
+    path.write_text(header + lines(ACCENTS * 200, "\t"), encoding="utf-8")
+    head, chunks = sample_file(str(path))
+    assert rank_separators(head.decode().splitlines()) == []
+    assert detect_import_format(str(path)) == ("utf-8", ["\t"])
+
+
+def make_apkg(path, notes, media=None, collection="collection.anki2"):
+    """Write an Anki package holding `notes` (lists of fields) and `media` ({file name: bytes})."""
+    db_path = path.parent / "collection.db"
+    db = sqlite3.connect(str(db_path))
+    db.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, flds TEXT)")
+    db.executemany("INSERT INTO notes VALUES (?, ?)", [(i, "\x1f".join(fields)) for i, fields in enumerate(notes)])
+    db.commit()
+    db.close()
+    media = media or {}
+    with zipfile.ZipFile(path, "w") as package:
+        package.write(db_path, collection)
+        package.writestr("media", json.dumps({str(i): name for i, name in enumerate(media)}))
+        for i, data in enumerate(media.values()):
+            package.writestr(str(i), data)
+
+
+def test_read_apkg_turns_notes_into_cards(tmp_path):
+    path = tmp_path / "deck.apkg"
+    notes = [
+        ["<b>chat</b>", "cat<br>(animal)"],
+        ["<div>Tom &amp; Jerry</div>", "&lt;cartoon&gt;"],
+        ["{{c1::Paris}} is the capital of {{c2::France::country}}", "Geography"],
+        ["{{c1::H2O}} is water", ""],
+        ["<img src='missing.png'>", ""],
+        ["only a question"],
+    ]
+    make_apkg(path, notes)
+    cards = [(card.question, card.answer) for card in read_apkg(str(path))]
+    assert cards == [
+        ("chat", "cat\n(animal)"),
+        ("Tom & Jerry", "<cartoon>"),
+        ("[...] is the capital of [country]", "Paris is the capital of France\n\nGeography"),
+        ("[...] is water", "H2O is water"),
+    ]
+
+
+def test_read_apkg_copies_the_media_fields_refer_to(tmp_path):
+    path = tmp_path / "deck.apkg"
+    notes = [
+        ['dog <img src="dog.png">', "chien [sound:chien.mp3]"],
+        ["<img src='unused.png'>bird", "oiseau"],
+        ['<img src="dog.png">', "dog again"],
+    ]
+    media = {"dog.png": b"dog picture", "chien.mp3": b"chien sound", "other.png": b"never referred to"}
+    make_apkg(path, notes, media)
+    store = MediaStore(str(tmp_path / "library"))
+
+    cards = list(read_apkg(str(path), media=store))
+    assert [(card.question, card.answer) for card in cards] == [("dog", "chien"), ("bird", "oiseau"), ("", "dog again")]
+    assert set(cards[0].media) == {"question_image", "answer_audio"}
+    with open(store.path(cards[0].media["question_image"]), "rb") as f:
+        assert f.read() == b"dog picture"
+    with open(store.path(cards[0].media["answer_audio"]), "rb") as f:
+        assert f.read() == b"chien sound"
+    assert cards[0].media["question_image"].endswith(".png")
+    # A file missing from the package is left out; the same file is stored once
+    assert cards[1].media == {}
+    assert cards[2].media == {"question_image": cards[0].media["question_image"]}
+    # Without a store the text is still read, and a note that was only an image has no question left
+    assert [(card.question, card.media) for card in read_apkg(str(path))] == [("dog", {}), ("bird", {})]
+
+
+def test_read_apkg_prefers_the_newer_collection(tmp_path):
+    path = tmp_path / "deck.apkg"
+    make_apkg(path, [["new", "neu"]], collection="collection.anki21")
+    with zipfile.ZipFile(path, "a") as package:
+        package.writestr("collection.anki2", b"placeholder for old Anki versions")
+    assert [(card.question, card.answer) for card in read_apkg(str(path))] == [("new", "neu")]
+
+
+def test_read_apkg_rejects_packages_without_a_readable_collection(tmp_path):
+    path = tmp_path / "deck.apkg"
+    with zipfile.ZipFile(path, "w") as package:
+        package.writestr("collection.anki21b", b"zstd compressed")
+        package.writestr("media", b"")
+    with pytest.raises(ValueError, match="Support older Anki versions"):
+        list(read_apkg(str(path)))
+
+
+def test_read_table_maps_columns_by_header(tmp_path):
+    path = tmp_path / "words.csv"
+    path.write_text(
+        "Notes,Back,Front,Status\n"
+        "x,chien,dog,know\n"
+        'y,"chat, le",cat,bogus\n'
+        "z,,empty,new\n"
+        "short\n"
+        "w,oiseau,bird\n",
+        encoding="utf-8",
+    )
+    cards = [(card.question, card.answer, card.status) for card in read_table(str(path))]
+    assert cards == [("dog", "chien", "know"), ("cat", "chat, le", "new"), ("bird", "oiseau", "new")]
+
+
+def test_read_table_without_a_header_uses_the_first_two_columns(tmp_path):
+    path = tmp_path / "words.tsv"
+    path.write_text("dog\tchien\textra\ncat\tchat\n\tno question\n", encoding="utf-8")
+    cards = [(card.question, card.answer, card.status) for card in read_table(str(path), separator="\t")]
+    assert cards == [("dog", "chien", "new"), ("cat", "chat", "new")]
+    # An unrecognised header is read as a card
+    path.write_text("English,French\nkey,clé\n", encoding="utf-8")
+    assert [(card.question, card.answer) for card in read_table(str(path))] == [("English", "French"), ("key", "clé")]
+    path.write_text("", encoding="utf-8")
+    assert list(read_table(str(path))) == []
@@ -0,0 +1,52 @@
+import gzip
+import os
+import threading
+
+import flashcard_app
+from flashcard_app import DataManager
+
+
+def data_path(home):
+    os.makedirs(home / ".flashcardapp", exist_ok=True)
+    return home / ".flashcardapp" / "flashcards.json"
+
+
+def load_in_background(manager, monkeypatch):
+    # Run what the worker hands to the main thread right away
+    monkeypatch.setattr(flashcard_app.Clock, "schedule_once", lambda callback, timeout=0: callback(0))
+    ready = threading.Event()
+    manager.load_in_background(ready.set)
+    assert ready.wait(10)
+
+
+def test_missing_file_starts_default_library(home):
+    manager = DataManager()
+    assert manager.ready and manager.load_error is None
+    assert [folder.name for folder in manager.folders] == ["Default Folder"]
+
+
+def test_corrupt_file_is_kept_and_library_starts_empty(home):
+    junk = b"\x1f\x8b\x08\x00" + b"garbage" * 20
+    data_path(home).write_bytes(junk)
+    manager = DataManager()
+    error, kept = manager.load_error
+    assert isinstance(error, ValueError)
+    assert open(kept, "rb").read() == junk
+    assert [folder.name for folder in manager.folders] == ["Default Folder"]
+
+
+def test_background_load_survives_corrupt_file(home, monkeypatch):
+    junk = gzip.compress(b"[{]")[:-6] + b"truncated"
+    data_path(home).write_bytes(junk)
+    manager = DataManager(autoload=False)
+    load_in_background(manager, monkeypatch)
+    assert manager.ready
+    assert manager.load_error is not None and open(manager.load_error[1], "rb").read() == junk
+
+
+def test_unreadable_files_are_not_overwritten(home):
+    for junk in (b"[{not json", b"[{still not json"):
+        data_path(home).write_bytes(junk)
+        DataManager()
+    kept = sorted(name for name in os.listdir(home / ".flashcardapp") if ".unreadable-" in name)
+    assert len(kept) == 2
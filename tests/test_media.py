@@ -0,0 +1,65 @@
+import os
+import time
+
+import flashcard_app
+from flashcard_app import DataManager
+
+
+def age(path, seconds):
+    stamp = time.time() - seconds
+    os.utime(path, (stamp, stamp))
+
+
+def test_unused_media_is_collected_on_a_worker_thread(home):
+    manager = DataManager()
+    manager.add_card(0, 0, "q1", "a1")
+    manager.add_card(0, 0, "q2", "a2")
+    cards = manager.folders[0].decks[0].cards
+    sources = []
+    for i in range(3):
+        sources.append(home / f"image{i}.png")
+        sources[-1].write_bytes(b"image %d" % i)
+    used = manager.set_card_media(cards[0].id, "question_image", str(sources[0]))
+    manager.set_card_media(cards[1].id, "answer_image", str(sources[1]))
+    unused = manager.media.add(str(sources[2]))
+    manager.commands.clear()
+    # Detached without undo history: no longer referenced
+    manager.set_card_media(cards[1].id, "answer_image", None)
+    manager.commands.clear()
+    for dirpath, dirnames, filenames in os.walk(manager.media.root):
+        for filename in filenames:
+            age(os.path.join(dirpath, filename), 2 * manager.media.GRACE_PERIOD)
+
+    # The deck is read back from the data file by the worker, not decoded on this thread
+    reopened = DataManager()
+    deck = reopened.folders[0].decks[0]
+    assert not deck.loaded
+    reopened.collect_media_garbage().join(10)
+    assert not deck.loaded
+    assert os.path.exists(reopened.media.path(used))
+    assert not os.path.exists(reopened.media.path(unused))
+
+
+def test_media_references_never_decode_a_deck(home, monkeypatch):
+    manager = DataManager()
+    manager.add_card(0, 0, "q", "a")
+    image = home / "image.png"
+    image.write_bytes(b"image")
+    name = manager.set_card_media(manager.folders[0].decks[0].cards[0].id, "question_image", str(image))
+    manager.commands.clear()
+
+    def decode(deck):
+        raise AssertionError("decoded on the worker thread")
+
+    reopened = DataManager()
+    loaded = reopened.folders[0].decks[0]
+    loaded.cards
+    reopened.add_deck(0, "Unloaded")
+    reopened.save_data()
+    unloaded = reopened.folders[0].decks[1]
+    unloaded.unload()
+    # As if the deck cache unloaded a deck right after it was seen loaded
+    monkeypatch.setattr(flashcard_app.Deck, "loaded", property(lambda deck: True))
+    monkeypatch.setattr(flashcard_app.Deck, "_materialize", decode)
+    assert reopened.referenced_media([loaded, unloaded], []) == {name}
+    assert unloaded._cards is None
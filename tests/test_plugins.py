@@ -0,0 +1,86 @@
+import threading
+
+import flashcard_app
+from flashcard_app import Card, DataManager
+
+
+def filled_deck(manager, count):
+    deck = manager.folders[0].decks[0]
+    manager.append_cards(deck, (Card(f"q{i}", f"a{i}") for i in range(count)))
+    return deck
+
+
+def batched_writer(path, cards, **options):
+    """An exporter reporting every 700 cards, so its counts step past multiples of 1000."""
+    with open(path, "w") as f:
+        written = 0
+        for card in cards:
+            f.write(card.question + "\n")
+            written += 1
+            if written % 700 == 0:
+                yield written
+        yield written
+
+
+def test_export_progress_with_uneven_batches(home, monkeypatch):
+    monkeypatch.setattr(flashcard_app, "exporters", flashcard_app.PluginRegistry("export", "write"))
+    flashcard_app.exporters.register([".lst"], batched_writer)
+    manager = DataManager()
+    deck = filled_deck(manager, 3000)
+    reports = []
+    assert manager.export_deck(deck, str(home / "out.lst"), progress=reports.append) == 3000
+    assert reports == [1400, 2100, 3000]
+
+
+def test_export_cancel_with_uneven_batches(home, monkeypatch):
+    monkeypatch.setattr(flashcard_app, "exporters", flashcard_app.PluginRegistry("export", "write"))
+    flashcard_app.exporters.register([".lst"], batched_writer)
+    manager = DataManager()
+    deck = filled_deck(manager, 2900)
+    (home / "out.lst").write_text("previous")
+    cancel = threading.Event()
+    cancel.set()
+    assert manager.export_deck(deck, str(home / "out.lst"), cancel=cancel) is None
+    assert (home / "out.lst").read_text() == "previous"
+    assert sorted(path.name for path in home.iterdir() if path.suffix == ".lst") == ["out.lst"]
+
+
+def test_exported_csv_imports_back_without_duplicates(home):
+    manager = DataManager()
+    deck = filled_deck(manager, 10)
+    assert manager.export_deck(deck, str(home / "out.csv")) == 10
+    # Everything is already in the deck
+    assert manager.import_cards_from_file(0, 0, str(home / "out.csv"), ",") == 0
+    other = manager.add_deck(0, "Other")
+    assert manager.import_cards_from_file(0, other, str(home / "out.csv"), ",") == 10
+
+
+def test_import_progress_and_cancel(home):
+    path = home / "cards.txt"
+    path.write_text("".join(f"q{i};a{i}\n" for i in range(2500)))
+    manager = DataManager()
+    reports = []
+    assert len(manager.read_import(str(path), progress=reports.append)) == 2500
+    assert reports == [1000, 2000, 2500]
+    cancel = threading.Event()
+    cancel.set()
+    assert manager.read_import(str(path), cancel=cancel) is None
+
+
+def test_plugin_module_is_imported_on_first_use(home, monkeypatch):
+    monkeypatch.setattr(flashcard_app, "importers", flashcard_app.PluginRegistry("import", "read"))
+    plugins = home / "plugins"
+    plugins.mkdir()
+    (plugins / "import_pipe.py").write_text(
+        "import flashcard_app\n"
+        "def read(path, **options):\n"
+        "    with open(path) as f:\n"
+        "        yield [flashcard_app.Card(*line.strip().split('|')) for line in f]\n"
+    )
+    flashcard_app.importers.add_directory(str(plugins))
+    assert ".pipe" in flashcard_app.importers.extensions()
+    plugin = flashcard_app.importers.find("cards.PIPE")
+    assert plugin._function is None
+    (home / "cards.pipe").write_text("q1|a1\nq2|a2\n")
+    cards = DataManager().read_import(str(home / "cards.pipe"), set())
+    assert [card.question for card in cards] == ["q1", "q2"] and plugin._function is not None
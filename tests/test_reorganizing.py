@@ -0,0 +1,200 @@
+from flashcard_app import DataManager
+
+
+def library(*decks):
+    """A manager with a second folder and the given decks ({name: [(question, status), ...]}) in the first."""
+    manager = DataManager()
+    manager.add_folder("Other")
+    for name, cards in decks:
+        di = manager.add_deck(0, name)
+        for question, status in cards:
+            manager.add_card(0, di, question, "a")
+            manager.update_card_status(manager.folders[0].decks[di].cards[-1].id, status)
+    return manager
+
+
+def reopened():
+    manager = DataManager()
+    manager.ensure_loaded()
+    return manager
+
+
+def layout(manager):
+    return [(folder.name, [deck.name for deck in folder.decks]) for folder in manager.folders]
+
+
+def cards(deck):
+    return [(card.question, card.status) for card in deck.cards]
+
+
+def card_ids(deck):
+    return [card.id for card in deck.cards]
+
+
+def test_move_deck_keeps_its_ids_and_is_undoable(home):
+    manager = library(("A", [("q1", "know")]))
+    deck = manager.folders[0].decks[1]
+    ids = card_ids(deck)
+    manager.set_current_folder_deck(0, 1)
+
+    assert manager.move_deck(deck.id, manager.folders[1].id)
+    assert layout(manager) == [("Default Folder", ["Default Deck"]), ("Other", ["A"])]
+    assert (manager.current_folder_index, manager.current_deck_index) == (1, 0)
+    saved = reopened()
+    assert layout(saved) == layout(manager)
+    assert card_ids(saved.get_deck(deck.id)) == ids
+    assert cards(saved.get_deck(deck.id)) == [("q1", "know")]
+
+    manager.undo()
+    assert layout(manager) == [("Default Folder", ["Default Deck", "A"]), ("Other", [])]
+    assert (manager.current_folder_index, manager.current_deck_index) == (0, 1)
+    assert layout(reopened()) == layout(manager)
+    manager.redo()
+    assert layout(reopened()) == [("Default Folder", ["Default Deck"]), ("Other", ["A"])]
+
+
+def test_reorder_decks_and_folders(home):
+    manager = library(("A", []), ("B", []))
+    manager.move_deck(manager.folders[0].decks[2].id, manager.folders[0].id, 0)
+    manager.move_folder(manager.folders[1].id, 0)
+    assert layout(manager) == [("Other", []), ("Default Folder", ["B", "Default Deck", "A"])]
+    assert layout(reopened()) == layout(manager)
+    manager.undo()
+    manager.undo()
+    assert layout(reopened()) == [("Default Folder", ["Default Deck", "A", "B"]), ("Other", [])]
+
+
+def test_copy_deck_gets_new_ids_and_the_same_contents(home):
+    manager = library(("A", [("q1", "know"), ("q2", "dont_know")]))
+    deck = manager.folders[0].decks[1]
+    deck.cards[0].media = {"question_image": "blob.png"}
+    deck.mark_dirty(deck.cards[0])
+
+    copy = manager.copy_deck(deck.id)
+    assert layout(manager)[0] == ("Default Folder", ["Default Deck", "A", "A (copy)"])
+    assert cards(copy) == cards(deck)
+    assert copy.id != deck.id and not set(card_ids(copy)) & set(card_ids(deck))
+    assert copy.cards[0].media == {"question_image": "blob.png"}
+    assert copy.cards[0].media is not deck.cards[0].media
+    # The copy is independent of the original
+    manager.update_card_status(copy.cards[0].id, "new")
+    assert deck.cards[0].status == "know"
+    saved = reopened()
+    assert cards(saved.get_deck(copy.id)) == [("q1", "new"), ("q2", "dont_know")]
+    assert cards(saved.get_deck(deck.id)) == [("q1", "know"), ("q2", "dont_know")]
+
+    other = manager.copy_deck(deck.id, manager.folders[1].id, "Elsewhere")
+    assert layout(manager)[1] == ("Other", ["Elsewhere"])
+    manager.undo()
+    assert manager.get_deck(other.id) is None
+    assert layout(reopened())[1] == ("Other", [])
+
+
+def test_copy_folder_copies_every_deck(home):
+    manager = library(("A", [("q1", "know")]))
+    folder = manager.folders[0]
+    copy = manager.copy_folder(folder.id)
+    assert layout(manager) == [
+        ("Default Folder", ["Default Deck", "A"]),
+        ("Default Folder (copy)", ["Default Deck", "A"]),
+        ("Other", []),
+    ]
+    assert cards(copy.decks[1]) == [("q1", "know")]
+    assert copy.decks[1].cards[0].id != folder.decks[1].cards[0].id
+    assert manager.get_card(copy.decks[1].cards[0].id) is copy.decks[1].cards[0]
+    assert layout(reopened()) == layout(manager)
+
+    manager.undo()
+    assert manager.get_folder(copy.id) is None and manager.get_deck(copy.decks[1].id) is None
+    assert layout(reopened()) == [("Default Folder", ["Default Deck", "A"]), ("Other", [])]
+
+
+def test_merge_decks_keeps_card_ids_and_history(home):
+    manager = library(("A", [("a1", "know"), ("a2", "new")]), ("B", [("b1", "dont_know")]))
+    source, target = manager.folders[0].decks[1], manager.folders[0].decks[2]
+    ids = card_ids(source)
+    manager.edit_card(ids[0], "a1 edited", "a")
+
+    assert manager.merge_decks(source.id, target.id) == 2
+    assert layout(manager)[0] == ("Default Folder", ["Default Deck", "B"])
+    assert cards(target) == [("b1", "dont_know"), ("a1 edited", "know"), ("a2", "new")]
+    assert card_ids(target)[1:] == ids
+    assert manager.get_deck(source.id) is None
+    assert manager.get_card(ids[0]) is target.cards[1]
+    saved = reopened()
+    assert card_ids(saved.get_deck(target.id))[1:] == ids
+    assert saved.get_deck(source.id) is None
+
+    # Undoing the merge brings the same deck back, and what was done before it can still be undone
+    assert manager.undo() is not None
+    assert manager.get_deck(source.id) is source
+    assert cards(source) == [("a1 edited", "know"), ("a2", "new")]
+    assert cards(target) == [("b1", "dont_know")]
+    assert manager.undo() is not None
+    assert source.cards[0].question == "a1"
+    saved = reopened()
+    assert cards(saved.get_deck(source.id)) == [("a1", "know"), ("a2", "new")]
+    manager.redo()
+    manager.redo()
+    assert layout(reopened())[0] == ("Default Folder", ["Default Deck", "B"])
+
+
+def test_merge_into_the_current_deck_follows_it(home):
+    manager = library(("A", [("a1", "new")]), ("B", []))
+    manager.set_current_folder_deck(0, 1)
+    manager.merge_decks(manager.folders[0].decks[1].id, manager.folders[0].decks[2].id)
+    assert manager.get_current_deck().name == "B"
+    assert (manager.current_folder_index, manager.current_deck_index) == (0, 1)
+
+
+def test_merge_folders_moves_every_deck(home):
+    manager = library(("A", [("a1", "new")]), ("B", []))
+    source, target = manager.folders
+    deck_ids = [deck.id for deck in source.decks]
+
+    assert manager.merge_folders(source.id, target.id)
+    assert layout(manager) == [("Other", ["Default Deck", "A", "B"])]
+    assert manager.get_folder(source.id) is None
+    assert [deck.id for deck in target.decks] == deck_ids
+    assert layout(reopened()) == layout(manager)
+
+    manager.undo()
+    assert layout(manager) == [("Default Folder", ["Default Deck", "A", "B"]), ("Other", [])]
+    assert manager.get_folder(source.id) is source
+    assert layout(reopened()) == layout(manager)
+
+
+def test_split_deck_and_undo_put_cards_back_in_place(home):
+    statuses = ["know", "new", "know", "dont_know", "know"]
+    manager = library(("A", [(f"q{i}", status) for i, status in enumerate(statuses)]))
+    deck = manager.folders[0].decks[1]
+    before = cards(deck)
+    ids = card_ids(deck)
+
+    split = manager.split_deck(deck.id, "know")
+    assert split.name == "A (know)"
+    assert layout(manager)[0] == ("Default Folder", ["Default Deck", "A", "A (know)"])
+    assert cards(split) == [("q0", "know"), ("q2", "know"), ("q4", "know")]
+    assert cards(deck) == [("q1", "new"), ("q3", "dont_know")]
+    assert cards(reopened().get_deck(split.id)) == cards(split)
+
+    manager.undo()
+    assert cards(deck) == before and card_ids(deck) == ids
+    assert manager.get_deck(split.id) is None
+    assert all(manager.get_card(card_id) is card for card_id, card in zip(ids, deck.cards))
+    assert cards(reopened().get_deck(deck.id)) == before
+    manager.redo()
+    assert cards(deck) == [("q1", "new"), ("q3", "dont_know")]
+    assert cards(reopened().get_deck(split.id)) == [("q0", "know"), ("q2", "know"), ("q4", "know")]
+
+
+def test_operations_on_missing_records_do_nothing(home):
+    manager = library(("A", []))
+    deck = manager.folders[0].decks[1]
+    assert not manager.move_deck("missing", manager.folders[1].id)
+    assert not manager.move_deck(deck.id, "missing")
+    assert manager.copy_deck("missing") is None
+    assert manager.merge_decks(deck.id, deck.id) == 0
+    assert not manager.merge_folders(manager.folders[0].id, manager.folders[0].id)
+    assert manager.split_deck("missing", "know") is None
+    assert layout(manager) == [("Default Folder", ["Default Deck", "A"]), ("Other", [])]
@@ -0,0 +1,133 @@
+import datetime
+import time
+
+from flashcard_app import DataManager, ReviewLog, retention_bucket
+
+DAY = 86400
+
+
+def day_of(timestamp):
+    return datetime.date.fromtimestamp(timestamp)
+
+
+def test_daily_totals_per_deck(tmp_path):
+    log = ReviewLog(str(tmp_path))
+    now = time.time()
+    log.record("c1", "d1", "know", response_ms=1000, timestamp=now - 2 * DAY)
+    log.record("c1", "d1", "dont_know", response_ms=3000, timestamp=now - 2 * DAY)
+    log.record("c2", "d1", "know", response_ms=500, timestamp=now)
+    log.record("c3", "d2", "know", timestamp=now)
+
+    assert log.totals("d1") == (3, 2, 4500)
+    assert log.totals("d2") == (1, 1, 0)
+    assert log.totals() == (4, 3, 4500)
+    assert log.totals("missing") == (0, 0, 0)
+    assert log.reviews_per_day("d1") == [(day_of(now - 2 * DAY), 2, 1), (day_of(now), 1, 1)]
+    assert log.reviews_per_day() == [(day_of(now - 2 * DAY), 2, 1), (day_of(now), 2, 2)]
+    # Only the last `days` days are returned
+    assert log.reviews_per_day("d1", days=1) == [(day_of(now), 1, 1)]
+
+
+def test_card_stats_count_lapses(tmp_path):
+    log = ReviewLog(str(tmp_path))
+    now = time.time()
+    for offset, status in enumerate(["know", "dont_know", "dont_know", "know"]):
+        log.record("c1", "d1", status, timestamp=now + offset)
+    row = log.db.execute("SELECT deck, reviews, lapses, last_ts FROM card_stats WHERE card = 'c1'").fetchone()
+    assert row == ("d1", 4, 2, now + 3)
+    assert log.last_review_times() == {"c1": now + 3}
+    log.record("c1", "d1", "know", timestamp=now + 10)
+    assert log.last_review_times() == {"c1": now + 10}
+
+
+def test_retention_buckets():
+    assert [retention_bucket(days) for days in (0, 0.5, 1, 1.9, 2, 3, 4, 7, 8, 15, 16)] == [
+        0,
+        0,
+        1,
+        1,
+        2,
+        2,
+        3,
+        3,
+        4,
+        4,
+        5,
+    ]
+
+
+def test_retention_curve_counts_repeat_reviews_by_elapsed_time(tmp_path):
+    log = ReviewLog(str(tmp_path))
+    now = time.time()
+    # A card's first review has nothing to be retained from
+    log.record("c1", "d1", "know", timestamp=now)
+    assert log.retention_curve() == []
+    log.record("c1", "d1", "know", timestamp=now + 3600)
+    log.record("c1", "d1", "dont_know", timestamp=now + 3600 + 5 * DAY)
+    log.record("c2", "d2", "know", timestamp=now)
+    log.record("c2", "d2", "know", timestamp=now + 6 * DAY)
+
+    assert log.retention_curve("d1") == [(0, 1, 1), (3, 1, 0)]
+    assert log.retention_curve() == [(0, 1, 1), (3, 2, 1)]
+
+
+def test_hardest_cards(tmp_path):
+    log = ReviewLog(str(tmp_path))
+    now = time.time()
+    answers = {
+        "always": ["dont_know", "dont_know"],
+        "half": ["know", "dont_know", "know", "dont_know"],
+        "once": ["dont_know", "know", "know", "know"],
+        "never": ["know", "know"],
+        "single": ["dont_know"],
+    }
+    for card, statuses in answers.items():
+        for offset, status in enumerate(statuses):
+            log.record(card, "d1" if card != "once" else "d2", status, timestamp=now + offset)
+
+    # Highest share of lapses first; cards never lapsed or reviewed too few times are left out
+    assert log.hardest_cards() == [("always", 2, 2), ("half", 4, 2), ("once", 4, 1)]
+    assert log.hardest_cards("d1") == [("always", 2, 2), ("half", 4, 2)]
+    assert log.hardest_cards(limit=1) == [("always", 2, 2)]
+    # Equal shares put the card with more lapses first
+    assert log.hardest_cards(min_reviews=1)[:2] == [("always", 2, 2), ("single", 1, 1)]
+
+
+def test_statistics_are_unchanged_by_compacting(tmp_path):
+    log = ReviewLog(str(tmp_path))
+    now = time.time()
+    for offset, status in [(400, "know"), (300, "dont_know"), (200, "dont_know"), (1, "know"), (0, "know")]:
+        log.record("c1", "d1", status, response_ms=100, timestamp=now - offset * DAY)
+    log.record("c2", "d1", "dont_know", timestamp=now - 250 * DAY)
+    log.record("c2", "d1", "dont_know", timestamp=now - 2 * DAY)
+
+    def statistics():
+        return (
+            log.totals(),
+            log.reviews_per_day(days=500),
+            log.retention_curve(),
+            log.hardest_cards(),
+            log.last_review_times().copy(),
+        )
+
+    before = statistics()
+    assert log.compact(keep_days=180) == 4
+    assert log.db.execute("SELECT COUNT(*) FROM reviews").fetchone()[0] == 3
+    log._last_times = None
+    assert statistics() == before
+    # Recording after compacting still folds into the kept rollups
+    log.record("c2", "d1", "know", timestamp=now)
+    assert log.totals() == (8, 4, 500)
+    assert log.hardest_cards()[0] == ("c2", 3, 2)
+
+
+def test_review_log_compacts_on_a_worker_thread(home):
+    manager = DataManager()
+    log = manager.review_log
+    now = time.time()
+    log.record("card", "deck", "know", timestamp=now - 400 * DAY)
+    log.record("card", "deck", "dont_know", timestamp=now)
+    log.compact_in_background().join(10)
+    assert log.db.execute("SELECT COUNT(*) FROM reviews").fetchone()[0] == 1
+    # The rollups keep what the deleted event counted
+    assert log.db.execute("SELECT SUM(reviews) FROM daily").fetchone()[0] == 2
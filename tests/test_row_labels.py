@@ -0,0 +1,74 @@
+import pytest
+
+from flashcard_app import RowCache, continues_grapheme, truncate_label
+
+FR, DE, JP = "\U0001f1eb\U0001f1f7", "\U0001f1e9\U0001f1ea", "\U0001f1ef\U0001f1f5"
+FAMILY = "\U0001f468\u200d\U0001f469\u200d\U0001f467"
+THUMBS_UP = "\U0001f44d\U0001f3fd"
+
+
+@pytest.mark.parametrize(
+    "previous, ch, regional, expected",
+    [
+        ("", "\u0301", 0, False),
+        ("a", "b", 0, False),
+        ("e", "\u0301", 0, True),
+        ("\U0001f468", "\u200d", 0, True),
+        ("\u200d", "\U0001f469", 0, True),
+        ("\U0001f44d", "\U0001f3fd", 0, True),
+        ("\u2764", "\ufe0f", 0, True),
+        ("\U0001f1eb", "\U0001f1f7", 1, True),
+        ("\U0001f1f7", "\U0001f1e9", 2, False),
+    ],
+)
+def test_continues_grapheme(previous, ch, regional, expected):
+    assert continues_grapheme(previous, ch, regional) == expected
+
+
+def test_short_text_is_kept_whole():
+    assert truncate_label("hello", 5) == "hello"
+    # More characters than the limit but no more clusters: nothing is cut, so no ellipsis
+    assert truncate_label("e\u0301" * 5, 5) == "e\u0301" * 5
+    assert truncate_label(FAMILY * 3, 3) == FAMILY * 3
+    assert truncate_label(FR + DE + JP, 3) == FR + DE + JP
+
+
+def test_line_breaks_and_runs_of_spaces_collapse():
+    assert truncate_label("first line\nsecond\n\n  third\t end ") == "first line second third end"
+    assert truncate_label("one two\nthree", 8) == "one two\u2026"
+
+
+def test_cut_at_cluster_boundaries():
+    assert truncate_label("abcdef", 3) == "abc\u2026"
+    assert truncate_label("cafe\u0301 au lait", 4) == "cafe\u0301\u2026"
+    assert truncate_label("e\u0301\u0302" * 4, 2) == "e\u0301\u0302" * 2 + "\u2026"
+    assert truncate_label(FAMILY * 4, 2) == FAMILY * 2 + "\u2026"
+    assert truncate_label(THUMBS_UP * 4, 3) == THUMBS_UP * 3 + "\u2026"
+    # Regional indicators pair up into flags from the start of the run
+    assert truncate_label(FR + DE + JP, 2) == FR + DE + "\u2026"
+    assert truncate_label("x" + FR + DE, 2) == "x" + FR + "\u2026"
+
+
+def test_row_cache_rebuilds_only_changed_rows():
+    built = []
+
+    def build(text):
+        built.append(text)
+        return [text]
+
+    rows = RowCache(build, capacity=2)
+    first = rows.get("c1", ("q", "a"), "q")
+    assert rows.get("c1", ("q", "a"), "q") is first
+    assert rows.peek("c1") is first
+    assert rows.builds == 1
+
+    edited = rows.get("c1", ("q edited", "a"), "q edited")
+    assert edited is not first and edited == ["q edited"]
+    assert rows.builds == 2
+
+    # Past capacity the least recently used row is dropped
+    rows.get("c2", ("q2", "a"), "q2")
+    rows.get("c1", ("q edited", "a"), "q edited")
+    rows.get("c3", ("q3", "a"), "q3")
+    assert rows.peek("c2") is None and rows.peek("c1") is edited
+    assert built == ["q", "q edited", "q2", "q3"]
@@ -0,0 +1,92 @@
+import json
+import os
+
+import flashcard_app
+from flashcard_app import DataManager, split_library
+
+
+def library():
+    manager = DataManager()
+    for i in range(3):
+        manager.add_deck(0, f"Deck {i}")
+    for di in range(4):
+        for ci in range(5):
+            manager.add_card(0, di, f"q{di}.{ci}", "a")
+    return manager
+
+
+def deck_lines(path):
+    with open(path, "rb") as f:
+        return [line for header, lines, offsets in split_library(f.read()) for line in lines]
+
+
+def count_encodes(monkeypatch):
+    """Record the name of every deck encoded into JSON from here on."""
+    encoded = []
+    to_dict = flashcard_app.Deck.to_dict
+
+    def counting(deck):
+        encoded.append(deck.name)
+        return to_dict(deck)
+
+    monkeypatch.setattr(flashcard_app.Deck, "to_dict", counting)
+    return encoded
+
+
+def test_only_changed_decks_are_encoded(home, monkeypatch):
+    path = library().get_data_path()
+    before = deck_lines(path)
+    manager = DataManager()
+    manager.ensure_loaded()
+    manager.folders[0].decks[1].unload()
+    encoded = count_encodes(monkeypatch)
+
+    manager.edit_card(manager.folders[0].decks[2].cards[0].id, "edited", "a")
+    assert encoded == ["Deck 1"]
+    after = deck_lines(path)
+    # The other lines are the bytes they were read as, including the unloaded deck's
+    assert after[:2] + after[3:] == before[:2] + before[3:]
+    assert after[2] != before[2]
+    assert manager.folders[0].decks[1]._cards is None
+
+    # A deck written once is not encoded again while it stays unchanged
+    manager.add_card(0, 3, "another", "card")
+    assert encoded == ["Deck 1", "Deck 2"]
+    assert deck_lines(path)[2] == after[2]
+
+
+def test_save_with_nothing_changed_writes_nothing(home, monkeypatch):
+    path = library().get_data_path()
+    manager = DataManager()
+    manager.ensure_loaded()
+    stat = os.stat(path)
+    encoded = count_encodes(monkeypatch)
+
+    def replace(src, dst):
+        raise AssertionError("the data file was rewritten")
+
+    monkeypatch.setattr(flashcard_app.os, "replace", replace)
+    manager.save_data()
+    assert encoded == []
+    assert not os.path.exists(path + ".tmp")
+    assert (os.stat(path).st_ino, os.stat(path).st_mtime_ns) == (stat.st_ino, stat.st_mtime_ns)
+
+
+def test_legacy_indented_file_is_rewritten_as_lines(home):
+    manager = library()
+    path = manager.get_data_path()
+    folders = [
+        {"id": folder.id, "name": folder.name, "decks": [deck.to_dict() for deck in folder.decks]}
+        for folder in manager.folders
+    ]
+    with open(path, "w") as f:
+        json.dump(folders, f, indent=2)
+
+    reopened = DataManager()
+    reopened.ensure_loaded()
+    assert [deck.to_dict() for deck in reopened.folders[0].decks] == folders[0]["decks"]
+    with open(path, "rb") as f:
+        raw = f.read()
+    assert len(split_library(raw)[0][1]) == 4
+    # Saved once in the new format, it is left alone from then on
+    assert DataManager()._signature == reopened._signature
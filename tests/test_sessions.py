@@ -0,0 +1,71 @@
+from flashcard_app import DataManager, SessionStore
+
+META = {"deck_id": "d1", "show_question_side": True, "reset_status": None, "order": "in_order", "typed": False}
+
+
+def test_marks_and_steps_back_are_replayed(tmp_path):
+    store = SessionStore(str(tmp_path))
+    store.start(META, ["c1", "c2", "c3"])
+    store.record_mark(0, "know")
+    store.record_mark(1, "dont_know")
+    store.record_back()
+    store.record_mark(1, "know")
+    store.record_mark(2, "unknown")
+    store.record_back()
+
+    meta, card_ids, history = SessionStore(str(tmp_path)).load()
+    assert meta == META
+    assert card_ids == ["c1", "c2", "c3"]
+    assert history == [(0, "know"), (1, "know")]
+
+
+def test_line_cut_short_is_skipped(tmp_path):
+    store = SessionStore(str(tmp_path))
+    store.start(META, ["c1", "c2"])
+    store.record_mark(0, "know")
+    store._append("1 kn")
+    assert store.load()[2] == [(0, "know")]
+
+
+def test_no_session_without_meta_or_cards(tmp_path):
+    store = SessionStore(str(tmp_path))
+    assert store.load() is None
+    store.start(META, [])
+    assert store.load() is None
+    store.start(META, ["c1"])
+    store.clear()
+    assert store.load() is None
+
+
+def test_study_marks_are_committed_as_one_command(home):
+    manager = DataManager()
+    for question in ("q1", "q2", "q3", "q4"):
+        manager.add_card(0, 0, question, "a")
+    deck = manager.folders[0].decks[0]
+    card_ids = [card.id for card in deck.cards]
+    # The last mark of a card wins; cards never marked get the reset status
+    history = [(0, "know"), (1, "dont_know"), (0, "dont_know")]
+
+    marked = ["dont_know", "dont_know", "unknown", "unknown"]
+    manager.commit_study_marks(deck, card_ids, history, reset_status="unknown")
+    assert [card.status for card in deck.cards] == marked
+    reopened = DataManager()
+    reopened.ensure_loaded()
+    assert [card.status for card in reopened.folders[0].decks[0].cards] == marked
+
+    manager.undo()
+    assert [card.status for card in deck.cards] == ["new"] * 4
+    manager.redo()
+    assert [card.status for card in deck.cards] == marked
+
+
+def test_study_marks_skip_cards_removed_meanwhile(home):
+    manager = DataManager()
+    manager.add_card(0, 0, "q1", "a")
+    manager.add_card(0, 0, "q2", "a")
+    deck = manager.folders[0].decks[0]
+    card_ids = [card.id for card in deck.cards]
+    manager.undo()
+
+    manager.commit_study_marks(deck, card_ids, [(0, "know"), (1, "know")])
+    assert [card.status for card in deck.cards] == ["know"]
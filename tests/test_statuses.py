@@ -0,0 +1,159 @@
+import random
+
+import pytest
+
+import flashcard_app
+from flashcard_app import STATUS_CODES, STATUS_WEIGHTS, STATUSES, Card, DataManager, Deck
+
+
+@pytest.fixture(params=["numpy", "plain"])
+def numpy_or_not(request, monkeypatch):
+    if request.param == "plain":
+        monkeypatch.setattr(flashcard_app, "numpy", None)
+    elif flashcard_app.numpy is None:
+        pytest.skip("numpy is not installed")
+
+
+def random_deck(count, seed=0):
+    rng = random.Random(seed)
+    deck = Deck("Deck")
+    cards = []
+    for i in range(count):
+        card = Card(f"q{i}", f"a{rng.randrange(3)}")
+        card.status = rng.choice(STATUSES)
+        cards.append(card)
+    deck.extend_cards(cards)
+    return deck
+
+
+def expected_changes(deck, status, match):
+    return {i: STATUS_CODES[card.status] for i, card in enumerate(deck.cards) if match(card) and card.status != status}
+
+
+def changes(deck, status, indices=None, where=None):
+    changed, old_codes = deck.status_changes(status, indices, where)
+    assert len(changed) == len(old_codes)
+    return dict(zip(changed, old_codes))
+
+
+@pytest.mark.parametrize("status", STATUSES)
+def test_status_changes_for_every_predicate(numpy_or_not, status):
+    deck = random_deck(200)
+    assert changes(deck, status) == expected_changes(deck, status, lambda card: True)
+    assert changes(deck, status, where="know") == expected_changes(deck, status, lambda card: card.status == "know")
+    names = {"new", "dont_know"}
+    assert changes(deck, status, where=names) == expected_changes(deck, status, lambda card: card.status in names)
+
+    def where(card):
+        return card.answer == "a1"
+
+    assert changes(deck, status, where=where) == expected_changes(deck, status, where)
+    indices = list(range(0, 200, 7))
+    assert changes(deck, status, indices=indices) == expected_changes(deck, status, lambda card: card._slot in indices)
+
+
+def test_status_changes_of_nothing(numpy_or_not):
+    assert changes(Deck("Empty"), "know") == {}
+    deck = random_deck(20)
+    assert changes(deck, "know", where="know") == {}
+    assert changes(deck, "know", where=set()) == {}
+
+
+def test_write_statuses_keeps_the_weights(numpy_or_not):
+    deck = random_deck(100)
+    deck.weights
+    changed, old_codes = deck.status_changes("know", where={"new", "unknown"})
+    # Few enough positions for the weights to be updated in place
+    deck.write_statuses(changed[:5], STATUS_CODES["know"])
+    assert deck._weights is not None
+    assert [deck.weights.weight(i) for i in range(100)] == [STATUS_WEIGHTS[code] for code in deck.statuses]
+    deck.write_statuses(changed[:5], old_codes[:5])
+    assert [deck.weights.weight(i) for i in range(100)] == [STATUS_WEIGHTS[code] for code in deck.statuses]
+    deck.write_statuses(changed, STATUS_CODES["know"])
+    assert deck.count_status("new") == deck.count_status("unknown") == 0
+    assert [deck.weights.weight(i) for i in range(100)] == [STATUS_WEIGHTS[code] for code in deck.statuses]
+    assert deck.dirty
+
+
+def library():
+    """A manager with two folders of two random decks each."""
+    manager = DataManager()
+    manager.add_folder("Other")
+    for fi, folder in enumerate(manager.folders):
+        if fi:
+            manager.add_deck(fi, "Deck")
+        manager.add_deck(fi, "Extra")
+        for di, deck in enumerate(folder.decks):
+            for card in random_deck(30, seed=fi * 2 + di).cards:
+                manager.add_card(fi, di, card.question, card.answer)
+                manager.update_card_status(deck.cards[-1].id, card.status)
+    manager.commands.clear()
+    return manager
+
+
+def library_codes(manager):
+    return [bytes(deck.statuses) for folder in manager.folders for deck in folder.decks]
+
+
+def reopened_codes():
+    manager = DataManager()
+    manager.ensure_loaded()
+    return library_codes(manager)
+
+
+@pytest.mark.parametrize("scope", ["deck", "folder", "library"])
+def test_bulk_set_status_is_one_undoable_command(numpy_or_not, home, scope):
+    manager = library()
+    before = library_codes(manager)
+    decks = [deck for folder in manager.folders for deck in folder.decks]
+    scoped = {"deck": decks[1:2], "folder": decks[2:], "library": decks}[scope]
+    kwargs = {"deck": {"deck": decks[1]}, "folder": {"folder": manager.folders[1]}, "library": {}}[scope]
+    statuses = [[card.status for card in deck.cards] for deck in decks]
+
+    manager.bulk_set_status("new", where={"know", "dont_know"}, **kwargs)
+    for deck, old in zip(decks, statuses):
+        if deck in scoped:
+            assert [card.status for card in deck.cards] == ["new" if s in ("know", "dont_know") else s for s in old]
+        else:
+            assert [card.status for card in deck.cards] == old
+    after = library_codes(manager)
+    assert reopened_codes() == after
+
+    manager.undo()
+    assert library_codes(manager) == before
+    assert reopened_codes() == before
+    manager.redo()
+    assert library_codes(manager) == after
+    assert reopened_codes() == after
+
+
+def test_bulk_set_status_with_a_callable_and_with_no_predicate(numpy_or_not, home):
+    manager = library()
+    before = library_codes(manager)
+    manager.bulk_set_status("unknown", where=lambda card: card.answer == "a0")
+    assert all(
+        card.status == "unknown"
+        for folder in manager.folders
+        for deck in folder.decks
+        for card in deck.cards
+        if card.answer == "a0"
+    )
+    middle = library_codes(manager)
+    manager.bulk_set_status("know")
+    assert all(code == STATUS_CODES["know"] for codes in library_codes(manager) for code in codes)
+
+    manager.undo()
+    assert library_codes(manager) == middle
+    manager.undo()
+    assert library_codes(manager) == before
+    assert reopened_codes() == before
+
+
+def test_set_status_of_chosen_cards(numpy_or_not, home):
+    manager = library()
+    deck = manager.folders[0].decks[0]
+    before = bytes(deck.statuses)
+    manager.set_status(deck, [0, 3, 5], "dont_know")
+    assert [deck.cards[i].status for i in (0, 3, 5)] == ["dont_know"] * 3
+    manager.undo()
+    assert bytes(deck.statuses) == before
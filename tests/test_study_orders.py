@@ -0,0 +1,137 @@
+import random
+from collections import Counter
+
+import pytest
+
+from flashcard_app import (
+    STATUS_CODES,
+    STATUS_WEIGHTS,
+    STATUSES,
+    Card,
+    Deck,
+    FenwickTree,
+    reservoir_sample,
+    status_positions,
+    study_order,
+    weighted_sample,
+)
+
+
+def make_deck(statuses):
+    deck = Deck("Deck")
+    deck.extend_cards([Card(f"q{i}", f"a{i}", status) for i, status in enumerate(statuses)])
+    return deck
+
+
+def random_deck(count, seed=0):
+    rng = random.Random(seed)
+    return make_deck([rng.choice(STATUSES) for _ in range(count)])
+
+
+def test_fenwick_tree_matches_plain_sums():
+    rng = random.Random(1)
+    weights = [rng.randrange(0, 10) for _ in range(200)]
+    tree = FenwickTree(weights)
+    for _ in range(300):
+        operation = rng.random()
+        if operation < 0.4:
+            index = rng.randrange(len(weights))
+            delta = rng.randrange(-weights[index], 10)
+            weights[index] += delta
+            tree.add(index, delta)
+        elif operation < 0.5:
+            weights.append(rng.randrange(0, 10))
+            tree.append(weights[-1])
+        count = rng.randrange(len(weights) + 1)
+        assert tree.prefix(count) == sum(weights[:count])
+    assert len(tree) == len(weights) and tree.total() == sum(weights)
+    assert [tree.weight(i) for i in range(len(weights))] == weights
+
+
+def test_fenwick_find_returns_the_covering_index():
+    weights = [3, 0, 1, 4, 0, 0, 2]
+    tree = FenwickTree(weights)
+    expected = [index for index, weight in enumerate(weights) for _ in range(weight)]
+    assert [tree.find(target) for target in range(tree.total())] == expected
+
+
+def test_weighted_sample_is_distinct_and_skips_zero_weights():
+    tree = FenwickTree([5, 0, 1, 0, 3])
+    picked = weighted_sample(tree, 10, random.Random(2))
+    assert sorted(picked) == [0, 2, 4]
+    # The tree is left as it was
+    assert [tree.weight(i) for i in range(5)] == [5, 0, 1, 0, 3]
+
+
+def test_weighted_sample_follows_the_weights():
+    tree = FenwickTree([1, 2, 4, 8])
+    rng = random.Random(3)
+    counts = Counter(weighted_sample(tree, 1, rng)[0] for _ in range(15000))
+    for index, weight in enumerate([1, 2, 4, 8]):
+        assert counts[index] / 15000 == pytest.approx(weight / 15, abs=0.02)
+
+
+@pytest.mark.parametrize("size, k", [(0, 3), (2, 5), (10, 10), (1000, 7)])
+def test_reservoir_sample_picks_distinct_items(size, k):
+    picked = reservoir_sample(iter(range(size)), k, random.Random(4))
+    assert len(picked) == min(size, k) and len(set(picked)) == len(picked)
+    assert all(0 <= item < size for item in picked)
+
+
+def test_reservoir_sample_is_uniform():
+    rng = random.Random(5)
+    counts = Counter(item for _ in range(4000) for item in reservoir_sample(range(20), 5, rng))
+    for item in range(20):
+        assert counts[item] / 4000 == pytest.approx(5 / 20, abs=0.04)
+
+
+def test_status_positions():
+    deck = random_deck(300)
+    for status in STATUSES:
+        expected = [i for i, card in enumerate(deck.cards) if card.status == status]
+        assert list(status_positions(deck.statuses, STATUS_CODES[status])) == expected
+
+
+def test_in_order_and_shuffled():
+    deck = random_deck(100)
+    assert list(study_order(deck)) == list(range(100))
+    shuffled = study_order(deck, "shuffled", seed=7)
+    assert sorted(shuffled) == list(range(100)) and list(shuffled) != list(range(100))
+    assert study_order(deck, "shuffled", seed=7) == shuffled
+    assert (
+        list(study_order(deck, "in_order", count=10, status="know"))
+        == [i for i, card in enumerate(deck.cards) if card.status == "know"][:10]
+    )
+
+
+@pytest.mark.parametrize("order", ["sample", "weighted"])
+def test_samples_are_distinct_and_respect_status(order):
+    deck = random_deck(500)
+    picked = study_order(deck, order, count=50, seed=8)
+    assert len(picked) == 50 and len(set(picked)) == 50
+    picked = study_order(deck, order, count=50, status="dont_know", seed=8)
+    assert len(set(picked)) == len(picked) == 50
+    assert all(deck.cards[i].status == "dont_know" for i in picked)
+    # Asking for more cards than there are gives them all
+    small = random_deck(5)
+    assert sorted(study_order(small, order, count=50, seed=8)) == list(range(5))
+
+
+def test_weights_follow_status_changes():
+    deck = random_deck(200)
+    deck.weights
+    rng = random.Random(9)
+    for _ in range(100):
+        deck.cards[rng.randrange(200)].status = rng.choice(STATUSES)
+    deck.add_card(Card("new", "card", "dont_know"))
+    expected = [STATUS_WEIGHTS[code] for code in deck.statuses]
+    assert [deck.weights.weight(i) for i in range(len(deck.cards))] == expected
+
+
+def test_weighted_order_favours_dont_know():
+    deck = make_deck(["know"] * 50 + ["dont_know"] * 50)
+    rng = random.Random(10)
+    firsts = Counter(
+        deck.cards[study_order(deck, "weighted", count=1, seed=rng.random())[0]].status for _ in range(4000)
+    )
+    assert firsts["dont_know"] / 4000 == pytest.approx(4 / 5, abs=0.03)
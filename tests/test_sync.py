@@ -0,0 +1,194 @@
+import os
+
+import pytest
+
+import flashcard_app
+from flashcard_app import DataManager
+from sync_server import SyncState
+
+
+@pytest.fixture
+def devices(tmp_path, monkeypatch):
+    """Two devices with their own libraries, and a server state they sync through."""
+    # Changes are only tracked once a server is configured; these tests never contact it
+    monkeypatch.setenv("FLASHCARD_SYNC_URL", "http://127.0.0.1:9")
+    managers = []
+    for name in ("a", "b"):
+        monkeypatch.setenv("HOME", str(tmp_path / name))
+        managers.append(DataManager())
+    return managers[0], managers[1], SyncState()
+
+
+def sync(manager, state):
+    pending, payload = manager.prepare_sync()
+    return manager.finish_sync(state.sync(payload["device"], payload["since"], payload["changes"]))
+
+
+def signature(manager):
+    return flashcard_app.file_signature(manager.get_data_path())
+
+
+def test_cards_reach_the_other_device(devices):
+    a, b, state = devices
+    for i in range(3):
+        a.add_card(0, 0, f"q{i}", f"a{i}")
+    sync(a, state)
+    sync(b, state)
+    deck = b.get_deck(a.folders[0].decks[0].id)
+    assert [card.question for card in deck.cards] == ["q0", "q1", "q2"]
+
+
+def test_own_changes_coming_back_change_nothing(devices):
+    a, b, state = devices
+    for i in range(3):
+        a.add_card(0, 0, f"q{i}", f"a{i}")
+    edited = [card.edited for card in a.folders[0].decks[0].cards]
+    before = signature(a)
+    # The server answers with every record changed since the last sync, our own included
+    sync(a, state)
+    sync(a, state)
+    assert [card.edited for card in a.folders[0].decks[0].cards] == edited
+    # Nothing was dirty, so the library file wasn't rewritten
+    assert signature(a) == before
+
+
+def test_edit_time_comes_from_the_remote_change(devices):
+    a, b, state = devices
+    a.add_card(0, 0, "q", "a")
+    sync(a, state)
+    sync(b, state)
+    card_id = a.folders[0].decks[0].cards[0].id
+    a.edit_card(card_id, "q2", "a")
+    stamp = a.sync.pending[card_id]["fields"]["question"]
+    sync(a, state)
+    sync(b, state)
+    card = b.get_card(card_id)
+    assert card.question == "q2" and card.edited == int(stamp)
+
+
+def test_concurrent_status_changes_keep_the_card_in_review(devices):
+    a, b, state = devices
+    a.add_card(0, 0, "q", "a")
+    sync(a, state)
+    sync(b, state)
+    card_id = a.folders[0].decks[0].cards[0].id
+    a.update_card_status(card_id, "dont_know")
+    b.update_card_status(card_id, "know")
+    sync(a, state)
+    sync(b, state)
+    sync(a, state)
+    assert a.get_card(card_id).status == b.get_card(card_id).status == "dont_know"
+
+
+def test_last_edit_wins(devices):
+    a, b, state = devices
+    a.add_card(0, 0, "q", "a")
+    sync(a, state)
+    sync(b, state)
+    card_id = a.folders[0].decks[0].cards[0].id
+    a.edit_card(card_id, "from a", "a")
+    b.edit_card(card_id, "from b", "a")
+    sync(a, state)
+    sync(b, state)
+    sync(a, state)
+    assert a.get_card(card_id).question == b.get_card(card_id).question == "from b"
+
+
+def test_local_edit_made_during_sync_is_kept(devices):
+    a, b, state = devices
+    a.add_card(0, 0, "q", "a")
+    sync(a, state)
+    sync(b, state)
+    card_id = a.folders[0].decks[0].cards[0].id
+    b.edit_card(card_id, "from b", "a")
+    sync(b, state)
+    pending, payload = a.prepare_sync()
+    response = state.sync(payload["device"], payload["since"], payload["changes"])
+    a.edit_card(card_id, "newer on a", "a")
+    a.finish_sync(response)
+    assert a.get_card(card_id).question == "newer on a"
+    assert os.path.exists(a.get_data_path())
+
+
+def receive(manager, *changes):
+    """Apply changes as if the server had sent them."""
+    manager.finish_sync({"seq": manager.sync.since + 1, "changes": list(changes)})
+
+
+def test_remote_folder_deletion_forgets_its_decks_and_cards(devices):
+    a, b, state = devices
+    a.add_card(0, 0, "q", "a")
+    folder = a.folders[0]
+    deck = folder.decks[0]
+    card = deck.cards[0]
+    receive(a, {"type": "folder", "id": folder.id, "fields": {}, "deleted": 1})
+    assert folder not in a.folders
+    assert a.get_folder(folder.id) is None and a.get_deck(deck.id) is None and a.get_card(card.id) is None
+    # A later change to the folder brings it back rather than renaming the orphan
+    receive(a, {"type": "folder", "id": folder.id, "fields": {"name": ["Restored", 2]}})
+    assert a.get_folder(folder.id) in a.folders and a.get_folder(folder.id).name == "Restored"
+
+
+def test_remote_deck_deletion_forgets_the_deck_and_its_cards(devices):
+    a, b, state = devices
+    a.add_card(0, 0, "q", "a")
+    folder = a.folders[0]
+    deck = folder.decks[0]
+    card = deck.cards[0]
+    receive(a, {"type": "deck", "id": deck.id, "fields": {}, "deleted": 1})
+    assert folder.decks == [] and a.get_deck(deck.id) is None and a.get_card(card.id) is None
+    receive(a, {"type": "deck", "id": deck.id, "fields": {"name": ["Restored", 2], "folder": [folder.id, 2]}})
+    assert [d.name for d in folder.decks] == ["Restored"] and a.get_deck(deck.id) is folder.decks[0]
+
+
+def test_merged_deck_disappears_on_the_other_device(devices):
+    a, b, state = devices
+    source = a.folders[0].decks[a.add_deck(0, "Source")]
+    target = a.folders[0].decks[0]
+    a.add_card(0, 1, "q", "a")
+    sync(a, state)
+    sync(b, state)
+    a.merge_decks(source.id, target.id)
+    sync(a, state)
+    sync(b, state)
+    assert b.get_deck(source.id) is None
+    assert all(deck.id != source.id for folder in b.folders for deck in folder.decks)
+    assert [card.question for card in b.get_deck(target.id).cards] == ["q"]
+
+
+def test_undone_merge_brings_the_deck_back_on_the_other_device(devices):
+    a, b, state = devices
+    source = a.folders[0].decks[a.add_deck(0, "Source")]
+    target = a.folders[0].decks[0]
+    a.add_card(0, 1, "q", "a")
+    a.merge_decks(source.id, target.id)
+    sync(a, state)
+    sync(b, state)
+    a.undo()
+    sync(a, state)
+    sync(b, state)
+    assert [deck.name for deck in b.get_folder(a.folders[0].id).decks] == ["Default Deck", "Source"]
+    assert [card.question for card in b.get_deck(source.id).cards] == ["q"]
+    assert b.get_deck(target.id).cards == []
+
+
+def test_remote_card_added_to_one_deck_keeps_history_of_the_others(devices):
+    a, b, state = devices
+    a.add_deck(0, "Other")
+    a.add_card(0, 0, "q1", "a")
+    a.add_card(0, 1, "q2", "a")
+    sync(a, state)
+    sync(b, state)
+    kept, dropped = [a.folders[0].decks[i].cards[0].id for i in (0, 1)]
+    a.edit_card(kept, "q1 edited", "a")
+    a.edit_card(dropped, "q2 edited", "a")
+    b.add_card(*b.locate_deck(a.folders[0].decks[1].id), "from b", "a")
+    sync(b, state)
+    sync(a, state)
+    assert [card.question for card in a.folders[0].decks[1].cards] == ["q2 edited", "from b"]
+    assert a.undo() is not None
+    assert a.get_card(kept).question == "q1"
+    assert a.get_card(dropped).question == "q2 edited"
+    # Adding q1 relied only on the deck nobody else changed; adding "Other" and q2 went with the edit of q2
+    assert a.undo() is not None and a.get_card(kept) is None
+    assert a.undo() is None